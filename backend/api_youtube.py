@@ -15,7 +15,7 @@ from .progress import update_progress, get_progress
 from .youtube_downloader import download_youtube_video, download_low_quality_for_analysis, extract_video_id
 from .clip_detector import (
     analyze_transcript_with_ai, detect_boundaries_hybrid, 
-    evaluate_clip_quality, count_comments_in_clips, 
+    evaluate_clips_quality, count_comments_in_clips, 
     detect_comment_density_clips, detect_emoji_density_clips
 )
 from .transcribe import transcribe_video, detect_streamer_context
@@ -237,18 +237,22 @@ async def analyze_video(request: AnalyzeRequest):
             logger.error(f"AI analysis failed: {e}")
             ai_clips = []
 
-        for clip in clips + ai_clips:
-            try:
-                evaluation = evaluate_clip_quality(
-                    vtt_path, clip['start'], clip['end'],
-                    ollama_host=request.ollama_host,
-                    ollama_model=request.ollama_model
-                )
-                clip['evaluation_score'] = evaluation['score']
-                clip['evaluation_reason'] = evaluation['reason']
-            except Exception as e:
-                clip['evaluation_score'] = 3
-                clip['evaluation_reason'] = "評価に失敗しました"
+        all_clips = clips + ai_clips
+        # evaluate_clips_quality はクリップごとの失敗を自前で既定値にするので、
+        # ここで捕まえるのはバッチ全体が失敗した場合だけ
+        failed_evaluation = {"score": 3, "reason": "評価に失敗しました"}
+        try:
+            evaluations = evaluate_clips_quality(
+                vtt_path, all_clips,
+                ollama_host=request.ollama_host,
+                ollama_model=request.ollama_model
+            )
+        except Exception as e:
+            logger.error(f"Clip evaluation failed: {e}")
+            evaluations = [failed_evaluation] * len(all_clips)
+        for clip, evaluation in zip(all_clips, evaluations):
+            clip['evaluation_score'] = evaluation.get('score', failed_evaluation['score'])
+            clip['evaluation_reason'] = evaluation.get('reason', failed_evaluation['reason'])
 
         return {
             "clips": clips,
@@ -1,45 +1,374 @@
+import heapq
+import io
 import os
+import random
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from types import MappingProxyType
+
+# Map frontend fonts to installed system fonts
+_FONT_MAPPING = {
+    'Noto Sans JP': 'Noto Sans CJK JP',
+    'Klee One': 'Noto Serif CJK JP', # Fallback for handwriting
+    'Dela Gothic One': 'Noto Sans CJK JP Black', # Fallback for heavy
+    'Kilgo U': 'Noto Sans CJK JP' # Fallback
+}
+
+# Defaults for every style field read by the style and per-event derivations
+_STYLE_DEFAULTS = {
+    'fontSize': 24,
+    'fontFamily': 'Noto Sans JP',
+    'fontWeight': 'normal',
+    'fontOpacity': 100,
+    'color': '#ffffff',
+    'outlineColor': '#000000',
+    'outerOutlineColor': '#ffffff',
+    'shadowColor': '#000000',
+    'backgroundColor': '#00000080',
+    'outlineWidth': 0,
+    'outerOutlineWidth': 0,
+    'shadowBlur': 0,
+    'alignment': 'center',
+    'verticalDirection': 'up',
+    'bottom': 10,
+    'prefix': '',
+    'prefixImage': None,
+    'prefixImageSize': 32,
+}
+
+# ASS uses numpad layout: 1-9 corresponding to screen positions
+_ALIGNMENT_MAP = {
+    'left': 1,      # bottom-left
+    'center': 2,    # bottom-center
+    'right': 3,     # bottom-right
+    'top-left': 7,  # top-left
+    'top': 8,       # top-center
+    'top-right': 9, # top-right
+}
+
+# Style names may not contain ',' (field separator); spaces become '_'
+_STYLE_NAME_TRANSLATION = str.maketrans({" ": "_", ",": None})
+
+# Style sizes (font, outline, shadow) are scaled 1.5x to match the preview appearance
+_SIZE_SCALE = 1.5
+# "bottom" is a percentage of the 1080px-tall canvas; MarginV = percent * 10.8
+_MARGIN_V_SCALE = 1080 / 100
+
+# Numpad alignments anchored to the top edge / the left edge
+_TOP_ALIGNS = frozenset((7, 8, 9))
+_LEFT_ALIGNS = frozenset((1, 7))
+
+# (MarginL, MarginR) per alignment. For PlayResX=1920, base margin is 5% = 96px;
+# left/right alignment gets ~8% (150px) on its anchored edge so text doesn't touch it.
+_MARGIN_LR = {
+    1: (150, 96), 7: (150, 96),  # left, top-left
+    3: (96, 150), 9: (96, 150),  # right, top-right
+}
+
+# verticalDirection re-anchors the numpad alignment:
+# 'down' forces top alignment (stack down).
+# 'up' (default) forces bottom alignment (stack up) - usually 'top' layout means stack down,
+# so if the user explicitly chose 'up' with a 'top' layout we force it to bottom anchors.
+_VERTICAL_ALIGNMENT = {
+    'down': {1: 7, 2: 8, 3: 9},
+    'up': {7: 1, 8: 2, 9: 3},
+}
+
+# VTT cue: timing line "00:00:01.000 --> 00:00:04.000" (hours optional, cue settings ignored)
+# followed by its text block, which runs up to the next blank line or end of file
+# Each timestamp is captured as integer fields (hours, minutes, seconds, fraction).
+_CUE_RE = re.compile(
+    r'^[ \t]*(?:(\d+):)?(\d+):(\d+)(?:\.(\d+))?[ \t]+-->[ \t]+(?:(\d+):)?(\d+):(\d+)(?:\.(\d+))?[^\n]*'
+    r'(.*?)(?=\n[ \t\r]*\n|\Z)',
+    re.MULTILINE | re.DOTALL
+)
+
+# [V4+ Styles] / [Events] section format lines
+_STYLES_FORMAT_LINE = "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding"
+_EVENTS_FORMAT_LINE = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+
+# File buffer for reading VTT input and writing ASS output, and the number of
+# Dialogue entries joined and encoded per write (an entry is one layered block of
+# up to 4 lines in generate_ass, one scrolling line in generate_danmaku_ass)
+_IO_BUFFER_SIZE = 1 << 20
+_WRITE_CHUNK_ENTRIES = 1024
+
+# Style fields after the name (see _STYLES_FORMAT_LINE): Fontname, Fontsize, PrimaryColour,
+# OutlineColour, BackColour, Bold, BorderStyle, Outline, Shadow, Alignment, MarginL/R/V.
+# SecondaryColour, italic/underline/strike, scale, spacing, angle and encoding are fixed.
+_STYLE_FIELDS_TPL = "%s,%s,%s,&H00000000,%s,%s,%s,0,0,0,100,100,0,0,%s,%s,%s,%s,%s,%s,%s,1"
+
+# Pinned \pos X for left/right alignments on the 1920-wide canvas; centered ones use PlayResX // 2
+_POS_X = {1: 150, 7: 150, 3: 1920 - 150, 9: 1920 - 150}
+
+# Layered subtitle event line; layer/style are filled once per style, leaving start, end, text
+_DIALOGUE_TPL = "\nDialogue: %d,%%(start)s,%%(end)s,%s_%s,,0,0,0,,%%(text)s"
+
+# Scrolling comment line: start, end, move from (start_x, y) to (end_x, y), text
+_DANMAKU_TPL = "\nDialogue: 0,%s,%s,Danmaku,,0,0,0,,{\\move(%s,%s,%s,%s)}%s"
+
+# Danmaku emoji shortcode (same as frontend: anything between colons that isn't a colon or space)
+_EMOJI_RE = re.compile(r':[^:\s]+:')
+
+# Two-digit uppercase hex for every byte value, used to assemble ASS colors
+_HEX_BYTE = tuple(f"{i:02X}" for i in range(256))
 
+@lru_cache(maxsize=256)
 def hex_to_ass_color(hex_color):
     """
     Convert hex color (#RRGGBB or #RRGGBBAA) to ASS format &HAABBGGRR.
     """
     hex_color = hex_color.lstrip('#')
     
-    r, g, b, a = 0, 0, 0, 0 # Default opaque
-    
-    if len(hex_color) == 6:
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
+    if len(hex_color) in (6, 8):
+        # Parse all channels at once and pull them out with shifts
+        v = int(hex_color, 16)
         a = 0 # Opaque in ASS (00)
-    elif len(hex_color) == 8:
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-        # CSS #RRGGBBAA: AA is opacity (00=transparent, FF=opaque)
-        # ASS Alpha: 00=opaque, FF=transparent
-        css_alpha = int(hex_color[6:8], 16)
-        a = 255 - css_alpha
-        
-    return f"&H{a:02X}{b:02X}{g:02X}{r:02X}"
+        if len(hex_color) == 8:
+            # CSS #RRGGBBAA: AA is opacity (00=transparent, FF=opaque)
+            # ASS Alpha: 00=opaque, FF=transparent (8-bit inversion: 255 - x == x ^ 0xFF)
+            a = (v & 0xFF) ^ 0xFF
+            v >>= 8
+        r, g, b = v >> 16, (v >> 8) & 0xFF, v & 0xFF
+        return "&H%08X" % ((a << 24) | (b << 16) | (g << 8) | r)
+        
+    return "&H00000000" # Default opaque black
+
+@lru_cache(maxsize=256)
+def _apply_font_alpha(ass_color_str, alpha_override):
+    """Replace the alpha bytes in an ASS color string &HAABBGGRR."""
+    # ass_color_str is like '&H00RRGGBB' or '&HAABBGGRR'
+    # Format: &H + AA + BB + GG + RR (8 hex chars)
+    # Keep BGR (last 6 chars), override AA. Cached so styles sharing a color and
+    # opacity share one string object.
+    return "&H" + _HEX_BYTE[alpha_override] + ass_color_str[4:]
 
 def parse_vtt_time(time_str):
-    """Parse VTT timestamp to seconds."""
-    parts = time_str.split(':')
-    seconds = float(parts[-1])
-    if len(parts) > 1:
-        seconds += int(parts[-2]) * 60
-    if len(parts) > 2:
-        seconds += int(parts[-3]) * 3600
-    return seconds
+    """Parse VTT timestamp (HH:MM:SS.mmm or MM:SS.mmm) to seconds."""
+    # Canonical fixed-width forms: read fields at known offsets as integer milliseconds
+    n = len(time_str)
+    if n == 12 and time_str[2] == ':' and time_str[5] == ':' and time_str[8] == '.':
+        return (((int(time_str[0:2]) * 60 + int(time_str[3:5])) * 60 + int(time_str[6:8])) * 1000 + int(time_str[9:12])) / 1000
+    if n == 9 and time_str[2] == ':' and time_str[5] == '.':
+        return ((int(time_str[0:2]) * 60 + int(time_str[3:5])) * 1000 + int(time_str[6:9])) / 1000
+    # Locate the colons directly instead of split() to avoid allocating a parts list
+    i1 = time_str.find(':')
+    if i1 < 0:
+        return float(time_str)
+    i2 = time_str.find(':', i1 + 1)
+    if i2 < 0:
+        return int(time_str[:i1]) * 60 + float(time_str[i1 + 1:])
+    return int(time_str[:i1]) * 3600 + int(time_str[i1 + 1:i2]) * 60 + float(time_str[i2 + 1:])
+
+def _cue_time(h, m, s, frac):
+    """Seconds from the captured fields of a cue timestamp (hours and fraction optional)."""
+    seconds = (int(h) * 60 + int(m)) * 60 + int(s) if h else int(m) * 60 + int(s)
+    if not frac:
+        return float(seconds)
+    # Scale to whole fraction units (milliseconds for VTT) so only one division rounds
+    scale = 10 ** len(frac)
+    return (seconds * scale + int(frac)) / scale
+
+@lru_cache(maxsize=4096)
+def _centiseconds_to_ass_time(cs):
+    s, cs = divmod(cs, 100)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return "%d:%02d:%02d.%02d" % (h, m, s, cs)
 
 def seconds_to_ass_time(seconds):
     """Convert seconds to ASS timestamp format (H:MM:SS.cc)."""
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = seconds % 60
-    return f"{h}:{m:02d}:{s:05.2f}"
+    # Round once to whole centiseconds: cue boundaries and danmaku start times that
+    # only differ below ASS precision share a cache entry, and 59.996s can no
+    # longer format as an invalid "0:00:60.00".
+    return _centiseconds_to_ass_time(round(seconds * 100))
+
+def _build_style_def(style_obj, h_multiplier):
+    """
+    Build the layered style fields (Box/Outer/Inner/Text) for one style.
+    Returns ((layer_suffix, fields), ...) without the style name, plus has_outer.
+    """
+    # Resolve every field against the defaults in one merge
+    s = {**_STYLE_DEFAULTS, **style_obj}
+    
+    # Apply 1.5x multiplier as requested by user to match preview appearance
+    font_size = int(s['fontSize'] * _SIZE_SCALE)
+    font_family = s['fontFamily']
+    font_weight = s['fontWeight']
+    
+    ass_font_family = _FONT_MAPPING.get(font_family, 'Noto Sans CJK JP')
+    
+    bold = -1 if font_weight == 'bold' else 0
+    
+    # fontOpacity: 0=completely transparent, 100=opaque (default)
+    # ASS alpha: 0x00=opaque, 0xFF=transparent
+    font_opacity_pct = s['fontOpacity']
+    font_alpha = int((1.0 - (font_opacity_pct / 100.0)) * 255)
+    font_alpha = max(0, min(255, font_alpha))
+
+    primary_color_base = hex_to_ass_color(s['color'])
+    outline_color_base = hex_to_ass_color(s['outlineColor'])
+    outer_outline_color_base = hex_to_ass_color(s['outerOutlineColor'])
+    shadow_color_base = hex_to_ass_color(s['shadowColor'])
+    back_color = hex_to_ass_color(s['backgroundColor'])
+
+    # Apply font alpha override (only if < 100%)
+    if font_alpha > 0:
+        primary_color = _apply_font_alpha(primary_color_base, font_alpha)
+        outline_color = _apply_font_alpha(outline_color_base, font_alpha)
+        outer_outline_color = _apply_font_alpha(outer_outline_color_base, font_alpha)
+        shadow_color = _apply_font_alpha(shadow_color_base, font_alpha)
+    else:
+        primary_color = primary_color_base
+        outline_color = outline_color_base
+        outer_outline_color = outer_outline_color_base
+        shadow_color = shadow_color_base
+
+    outline_width = int(s['outlineWidth'] * _SIZE_SCALE)
+    outer_outline_width = int(s['outerOutlineWidth'] * _SIZE_SCALE)
+    shadow_blur = int(s['shadowBlur'] * _SIZE_SCALE)
+
+    # MarginV calculation (approximate)
+    alignment = _ALIGNMENT_MAP.get(s['alignment'], 2)
+    
+    # Respect verticalDirection setting ('down' stacks from a top anchor, 'up' from a bottom one)
+    alignment = _VERTICAL_ALIGNMENT.get(s['verticalDirection'], {}).get(alignment, alignment)
+    
+    # Calculate total outline width for outer layer
+    total_outline = outline_width + outer_outline_width
+
+    # Calculate box padding for background - use minimum 8px for visibility
+    box_padding = max(outline_width, 8)
+
+    # margin_b calculation based on alignment anchor
+    bottom_percent = s['bottom']
+    if alignment in _TOP_ALIGNS:
+        # Top anchor: MarginV is from top
+        margin_v = int((100 - bottom_percent) * _MARGIN_V_SCALE)
+    else:
+        # Bottom anchor: MarginV is from bottom
+        margin_v = int(bottom_percent * _MARGIN_V_SCALE)
+        
+    # Calculate horizontal margins based on alignment
+    margin_l, margin_r = _MARGIN_LR.get(alignment, (96, 96))
+    # Left-anchored text makes room for the prefix image
+    if alignment in _LEFT_ALIGNS and s['prefixImage']:
+        # Removed 1.5x multiplier to match preview
+        image_size = int(s['prefixImageSize'])
+        spacing = 10
+        # Apply multiplier to match coordinate scaling in 9:16 videos
+        margin_l += int((image_size + spacing) * h_multiplier)
+
+    definitions = []
+
+    # Style 1: Background Box (Layer 0)
+    # BorderStyle 3 = opaque box, outline value acts as padding
+    # PrimaryColour is set to fully transparent (&HFF000000) to avoid ghosting if metrics differ
+    # The Box color comes from OutlineColour/BackColour
+    definitions.append(("Box", _STYLE_FIELDS_TPL % (ass_font_family, font_size, "&HFF000000", back_color, back_color, bold, 3, box_padding, 0, alignment, margin_l, margin_r, margin_v)))
+
+    # Style 2: Outer Outline (Layer 1)
+    if outer_outline_width > 0:
+        definitions.append(("Outer", _STYLE_FIELDS_TPL % (ass_font_family, font_size, outer_outline_color, outer_outline_color, shadow_color, bold, 1, total_outline, shadow_blur, alignment, margin_l, margin_r, margin_v)))
+
+    # Style 3: Inner Outline (Layer 2)
+    shadow_value = shadow_blur if outer_outline_width == 0 else 0
+    definitions.append(("Inner", _STYLE_FIELDS_TPL % (ass_font_family, font_size, primary_color, outline_color, shadow_color, bold, 1, outline_width, shadow_value, alignment, margin_l, margin_r, margin_v)))
+
+    # Style 4: Text (Layer 3)
+    definitions.append(("Text", _STYLE_FIELDS_TPL % (ass_font_family, font_size, primary_color, "&H00000000", "&H00000000", bold, 1, 0, 0, alignment, margin_l, margin_r, margin_v)))
+    
+    return tuple(definitions), outer_outline_width > 0
+
+def _style_items(style_obj):
+    """Hashable snapshot of a style dict for memoization, or None if it holds unhashable values."""
+    style_items = tuple(sorted(style_obj.items()))
+    try:
+        hash(style_items)
+    except TypeError:
+        return None
+    return style_items
+
+@lru_cache(maxsize=256)
+def _cached_style_def(style_items, h_multiplier):
+    return _build_style_def(dict(style_items), h_multiplier)
+
+def create_style_def(name, style_obj, h_multiplier=1.0):
+    """
+    Generate style definition strings for a style object.
+    Returns (definitions, has_outer). The style fields are cached per style contents,
+    so identical styles saved under different names (or re-rendered across
+    generate_ass calls) are built once and only re-labelled.
+    """
+    style_items = _style_items(style_obj)
+    if style_items is None:
+        # Unhashable values (nested objects) - build without caching
+        layers, has_outer = _build_style_def(style_obj, h_multiplier)
+    else:
+        layers, has_outer = _cached_style_def(style_items, h_multiplier)
+    return ["Style: %s_%s,%s" % (name, suffix, fields) for suffix, fields in layers], has_outer
+
+def _build_event_style(style_obj):
+    """Derive the per-event fields (outer layer, prefix, alignment, spacing) of a style."""
+    # Resolve every field against the defaults in one merge, as _build_style_def does
+    s = {**_STYLE_DEFAULTS, **style_obj}
+    
+    # Check outer outline (approximate check matching create_style_def logic)
+    has_outer = int(s['outerOutlineWidth'] * _SIZE_SCALE) > 0
+    
+    # Resolve Prefix
+    prefix = '' if s['prefixImage'] else s['prefix']
+        
+    # Resolve Alignment, respecting the verticalDirection setting
+    alignment = _ALIGNMENT_MAP.get(s['alignment'], 2)
+    alignment = _VERTICAL_ALIGNMENT.get(s['verticalDirection'], {}).get(alignment, alignment)
+    
+    # Helper: Get font size and base MarginV for spacing calculation
+    # This duplicates logic from create_style_def slightly but we need values here.
+    e_font_size = int(s['fontSize'] * _SIZE_SCALE)
+    # Determine MarginV based on alignment anchor
+    bottom_percent = s['bottom']
+    if alignment in _TOP_ALIGNS:
+         e_margin_v = int((100 - bottom_percent) * _MARGIN_V_SCALE)
+    else:
+         e_margin_v = int(bottom_percent * _MARGIN_V_SCALE)
+    
+    # Calculate box padding (needed for offset compensation)
+    e_outline_width = int(s['outlineWidth'] * _SIZE_SCALE)
+    e_box_padding = max(e_outline_width, 8)
+    
+    return {
+        "has_outer": has_outer,
+        "alignment": alignment,
+        "prefix": prefix,
+        "font_size": e_font_size,
+        "base_margin_v": e_margin_v,
+        "box_padding": e_box_padding
+    }
+
+@lru_cache(maxsize=256)
+def _cached_event_style(style_items):
+    # Every event sharing these style contents gets this same object: hand out a
+    # read-only view so a caller can't alter the fields for all of them
+    return MappingProxyType(_build_event_style(dict(style_items)))
+
+def _resolve_event_style(style_obj):
+    """Per-event style fields, derived once per distinct style contents."""
+    style_items = _style_items(style_obj)
+    if style_items is None:
+        return _build_event_style(style_obj)
+    return _cached_event_style(style_items)
+
+@lru_cache(maxsize=256)
+def _dialogue_block_template(style_name, has_outer):
+    """Per-style block of Dialogue lines (Box, [Outer], Inner, Text) awaiting start, end, text."""
+    layers = ((0, "Box"), (1, "Outer"), (2, "Inner"), (3, "Text")) if has_outer else ((0, "Box"), (2, "Inner"), (3, "Text"))
+    # Escape '%' in user style names so the second formatting pass leaves them intact
+    style_name = style_name.replace('%', '%%')
+    return "".join(_DIALOGUE_TPL % (layer, style_name, suffix) for layer, suffix in layers)
 
 def generate_ass(vtt_path, styles, output_path, saved_styles=None, style_map=None, video_info=None):
     """
@@ -57,457 +386,220 @@ def generate_ass(vtt_path, styles, output_path, saved_styles=None, style_map=Non
         h = video_info['height']
         h_multiplier = (h / w) * (16 / 9)
 
-    # Helper to generate style definition string
-    def create_style_def(name, style_obj):
-        # Apply 1.5x multiplier as requested by user to match preview appearance
-        font_size = int(style_obj.get('fontSize', 24) * 1.5)
-        font_family = style_obj.get('fontFamily', 'Noto Sans JP')
-        font_weight = style_obj.get('fontWeight', 'normal')
-        
-        # Map frontend fonts to installed system fonts
-        font_mapping = {
-            'Noto Sans JP': 'Noto Sans CJK JP',
-            'Klee One': 'Noto Serif CJK JP', # Fallback for handwriting
-            'Dela Gothic One': 'Noto Sans CJK JP Black', # Fallback for heavy
-            'Kilgo U': 'Noto Sans CJK JP' # Fallback
-        }
-        
-        ass_font_family = font_mapping.get(font_family, 'Noto Sans CJK JP')
-        
-        bold = -1 if font_weight == 'bold' else 0
-        
-        # fontOpacity: 0=completely transparent, 100=opaque (default)
-        # ASS alpha: 0x00=opaque, 0xFF=transparent
-        font_opacity_pct = style_obj.get('fontOpacity', 100)
-        font_alpha = int((1.0 - (font_opacity_pct / 100.0)) * 255)
-        font_alpha = max(0, min(255, font_alpha))
-
-        def apply_font_alpha(ass_color_str, alpha_override):
-            """Replace the alpha bytes in an ASS color string &HAABBGGRR."""
-            # ass_color_str is like '&H00RRGGBB' or '&HAABBGGRR'
-            # Format: &H + AA + BB + GG + RR (8 hex chars)
-            prefix = '&H'
-            body = ass_color_str[2:]  # strip '&H'
-            # Keep BGR, override AA
-            bgr = body[2:]  # last 6 chars = BBGGRR
-            return f"{prefix}{alpha_override:02X}{bgr}"
-        
-        primary_color_base = hex_to_ass_color(style_obj.get('color', '#ffffff'))
-        outline_color_base = hex_to_ass_color(style_obj.get('outlineColor', '#000000'))
-        outer_outline_color_base = hex_to_ass_color(style_obj.get('outerOutlineColor', '#ffffff'))
-        shadow_color_base = hex_to_ass_color(style_obj.get('shadowColor', '#000000'))
-        back_color = hex_to_ass_color(style_obj.get('backgroundColor', '#00000080'))
-
-        # Apply font alpha override (only if < 100%)
-        if font_alpha > 0:
-            primary_color = apply_font_alpha(primary_color_base, font_alpha)
-            outline_color = apply_font_alpha(outline_color_base, font_alpha)
-            outer_outline_color = apply_font_alpha(outer_outline_color_base, font_alpha)
-            shadow_color = apply_font_alpha(shadow_color_base, font_alpha)
-        else:
-            primary_color = primary_color_base
-            outline_color = outline_color_base
-            outer_outline_color = outer_outline_color_base
-            shadow_color = shadow_color_base
-
-        outline_width = int(style_obj.get('outlineWidth', 0) * 1.5)
-        outer_outline_width = int(style_obj.get('outerOutlineWidth', 0) * 1.5)
-        shadow_blur = int(style_obj.get('shadowBlur', 0) * 1.5)
-
-        # MarginV calculation (approximate)
-        # ASS uses numpad layout: 1-9 corresponding to screen positions
-        alignment_map = {
-            'left': 1,      # bottom-left
-            'center': 2,    # bottom-center
-            'right': 3,     # bottom-right
-            'top-left': 7,  # top-left
-            'top': 8,       # top-center  
-            'top-right': 9, # top-right
-        }
-        alignment = alignment_map.get(style_obj.get('alignment', 'center'), 2)
-        
-        # Respect verticalDirection setting
-        vertical_direction = style_obj.get('verticalDirection', 'up')
-        
-        # If 'down', force top alignment (stack down)
-        if vertical_direction == 'down':
-            if alignment == 1: alignment = 7
-            elif alignment == 2: alignment = 8
-            elif alignment == 3: alignment = 9
-            
-        # If 'up' (default), force bottom alignment (stack up) - strictly speaking only if explicitly 'top' types are not desired behavior
-        # But usually 'top' layout means stack down. If user selects 'top' layout but wants stack up, they should probably select 'center' + pos.
-        # However, to be safe, if user explicitly chose 'up' but layout is 'top', we force it to bottom anchors.
-        elif vertical_direction == 'up':
-            if alignment == 7: alignment = 1
-            elif alignment == 8: alignment = 2
-            elif alignment == 9: alignment = 3
-        
-        # Calculate total outline width for outer layer
-        total_outline = outline_width + outer_outline_width
-
-        # Calculate box padding for background - use minimum 8px for visibility
-        box_padding = max(outline_width, 8)
-
-        # margin_b calculation based on alignment anchor
-        bottom_percent = style_obj.get('bottom', 10)
-        if alignment in [7, 8, 9]:
-            # Top anchor: MarginV is from top
-            margin_v = int((100 - bottom_percent) * 10.8)
-        else:
-            # Bottom anchor: MarginV is from bottom
-            margin_v = int(bottom_percent * 10.8)
-            
-        # Calculate horizontal margins based on alignment
-        # For PlayResX=1920, base margin is 5% = 96px
-        # For left/right alignment, add extra margin to ensure text doesn't touch edges
-        if alignment in [1, 7]:  # left, top-left
-            margin_l = 150  # ~8% from left edge
-            # Check if this style has a prefix image
-            if style_obj and style_obj.get('prefixImage'):
-                image_url = style_obj['prefixImage']
-                # Removed 1.5x multiplier to match preview
-                image_size = int(style_obj.get('prefixImageSize', 32))
-                spacing = 10
-                # Apply multiplier to match coordinate scaling in 9:16 videos
-                margin_l += int((image_size + spacing) * h_multiplier)
-            margin_r = 96
-        elif alignment in [3, 9]:  # right, top-right
-            margin_l = 96
-            margin_r = 150  # ~8% from right edge
-        else:  # center
-            margin_l = 96
-            margin_r = 96
-
-        definitions = []
-
-        # Style 1: Background Box (Layer 0)
-        # BorderStyle 3 = opaque box, outline value acts as padding
-        # PrimaryColour is set to fully transparent (&HFF000000) to avoid ghosting if metrics differ
-        # The Box color comes from OutlineColour/BackColour
-        definitions.append(f"Style: {name}_Box,{ass_font_family},{font_size},&HFF000000,&H00000000,{back_color},{back_color},{bold},0,0,0,100,100,0,0,3,{box_padding},0,{alignment},{margin_l},{margin_r},{margin_v},1")
-
-        # Style 2: Outer Outline (Layer 1)
-        if outer_outline_width > 0:
-            definitions.append(f"Style: {name}_Outer,{ass_font_family},{font_size},{outer_outline_color},&H00000000,{outer_outline_color},{shadow_color},{bold},0,0,0,100,100,0,0,1,{total_outline},{shadow_blur},{alignment},{margin_l},{margin_r},{margin_v},1")
-
-        # Style 3: Inner Outline (Layer 2)
-        shadow_value = shadow_blur if outer_outline_width == 0 else 0
-        definitions.append(f"Style: {name}_Inner,{ass_font_family},{font_size},{primary_color},&H00000000,{outline_color},{shadow_color},{bold},0,0,0,100,100,0,0,1,{outline_width},{shadow_value},{alignment},{margin_l},{margin_r},{margin_v},1")
-
-        # Style 4: Text (Layer 3)
-        definitions.append(f"Style: {name}_Text,{ass_font_family},{font_size},{primary_color},&H00000000,&H00000000,&H00000000,{bold},0,0,0,100,100,0,0,1,0,0,{alignment},{margin_l},{margin_r},{margin_v},1")
-        
-        return definitions, outer_outline_width > 0
-
     # Parse VTT
     events = []
-    with open(vtt_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        
-    current_start = 0.0
-    current_end = 0.0
-    in_cue = False
-    text_lines = []
-    
-    for line in lines:
-        stripped = line.strip()
-        if "-->" in stripped:
-            times = stripped.split(" --> ")
-            current_start = parse_vtt_time(times[0])
-            current_end = parse_vtt_time(times[1])
-            in_cue = True
-            text_lines = []
-        elif stripped and in_cue and "WEBVTT" not in stripped:
-            if stripped.isdigit() and not text_lines: 
-                continue
-            text_lines.append(stripped)
-        elif not stripped and in_cue:
-            if text_lines:
-                text = "\\N".join(text_lines)
-                events.append({
-                    "start_sec": current_start,
-                    "end_sec": current_end,
-                    "text": text
-                })
-            in_cue = False
+    # Slurp the whole file through a 1 MiB buffer; cues are matched on the full text
+    with open(vtt_path, 'r', encoding='utf-8', buffering=_IO_BUFFER_SIZE) as f:
+        content = f.read()
+        
+    # One regex scan yields the start/end timestamp fields and text block of every cue
+    for sh, sm, ss, sf, eh, em, es, ef, block in _CUE_RE.findall(content):
+        text_lines = [t for t in (line.strip() for line in block.split('\n')) if t and "WEBVTT" not in t]
+        # Leading numeric lines are stray cue identifiers, not text
+        while text_lines and text_lines[0].isdigit():
+            text_lines.pop(0)
             
-    if in_cue and text_lines:
-        text = "\\N".join(text_lines)
-        events.append({
-            "start_sec": current_start,
-            "end_sec": current_end,
-            "text": text
-        })
+        if text_lines:
+            events.append({
+                "start_sec": _cue_time(sh, sm, ss, sf),
+                "end_sec": _cue_time(eh, em, es, ef),
+                "text": "\\N".join(text_lines)
+            })
 
     # Pre-calculate Styles for all events
-    expanded_events = []
     
-    # Helper to get alignment code without regenerating full style def
-    alignment_map = {
-        'left': 1, 'center': 2, 'right': 3,
-        'top-left': 7, 'top': 8, 'top-right': 9,
+    # Only saved styles that some event is mapped to need plans and Style: lines;
+    # a large style library otherwise costs a definition build per unused entry.
+    used_style_names = set(style_map.values()) if style_map else set()
+    used_saved_styles = {n: st for n, st in (saved_styles or {}).items() if n in used_style_names}
+    
+    # ASS-safe style names, sanitized once per used saved style
+    safe_names = {n: n.translate(_STYLE_NAME_TRANSLATION) for n in used_saved_styles}
+    
+    # Resolve every style once up front: (style_name, derived event fields)
+    default_plan = ("Default", _resolve_event_style(styles))
+    # A mapping to an unknown style falls back to Default without the outer layer
+    unknown_plan = ("Default", {**default_plan[1], "has_outer": False})
+    style_plans = {
+        name: (safe_names[name], _resolve_event_style(style_obj))
+        for name, style_obj in used_saved_styles.items()
     }
     
-    for i, event in enumerate(events):
-        style_name = "Default"
-        has_outer = False 
-        prefix = ""
-        alignment = 2 # default center
-        
-        # Determine Style Object
-        style_obj = styles # Default style object
-        
-        if style_map and str(i) in style_map:
-            mapped_name = style_map[str(i)]
-            safe_mapped_name = mapped_name.replace(" ", "_").replace(",", "")
-            if saved_styles and mapped_name in saved_styles:
-                style_name = safe_mapped_name
-                style_obj = saved_styles[mapped_name]
-                
-                # Check outer outline (approximate check matching create_style_def logic)
-                outer_w = int(style_obj.get('outerOutlineWidth', 0) * 1.5)
-                has_outer = (outer_w > 0)
-        else:
-             # Default style has_outer?
-             outer_w = int(styles.get('outerOutlineWidth', 0) * 1.5)
-             has_outer = (outer_w > 0)
-
-        # Resolve Prefix
-        if style_obj.get('prefixImage'):
-            prefix = ''
-        else:
-            prefix = style_obj.get('prefix', '')
-            
-        # Resolve Alignment
-        alignment = alignment_map.get(style_obj.get('alignment', 'center'), 2)
-        
-        # Respect verticalDirection setting
-        vertical_direction = style_obj.get('verticalDirection', 'up')
-        if vertical_direction == 'down':
-            if alignment == 1: alignment = 7
-            elif alignment == 2: alignment = 8
-            elif alignment == 3: alignment = 9
-        elif vertical_direction == 'up':
-            if alignment == 7: alignment = 1
-            elif alignment == 8: alignment = 2
-            elif alignment == 9: alignment = 3
-        
-        # Helper: Get font size and base MarginV for spacing calculation
-        # This duplicates logic from create_style_def slightly but we need values here.
-        e_font_size = int(style_obj.get('fontSize', 24) * 1.5)
-        # Determine MarginV based on alignment anchor
-        bottom_percent = style_obj.get('bottom', 10)
-        if alignment in [7, 8, 9]:
-             e_margin_v = int((100 - bottom_percent) * 10.8)
-        else:
-             e_margin_v = int(bottom_percent * 10.8)
-        
-        # Calculate box padding (needed for offset compensation)
-        e_outline_width = int(style_obj.get('outlineWidth', 0) * 1.5)
-        e_box_padding = max(e_outline_width, 8)
-
-        expanded_events.append({
-            "start": event["start_sec"],
-            "end": event["end_sec"],
-            "text": event["text"],
-            "style_name": style_name,
-            "alignment": alignment,
-            "has_outer": has_outer,
-            "prefix": prefix,
-            "font_size": e_font_size,
-            "base_margin_v": e_margin_v,
-            "box_padding": e_box_padding
-        })
-
-
-
-    # Merge Logic: Flatten overlaps into single events
-    merged_events = []
-    
-    # 1. Collect all time points
-    points = set()
-    for e in expanded_events:
-        points.add(e["start"])
-        points.add(e["end"])
-    times = sorted(list(points))
-    
-    # 2. Iterate intervals
-    for j in range(len(times) - 1):
-        t_start = times[j]
-        t_end = times[j+1]
-        
-        if t_end - t_start < 0.01: 
-            continue
-            
-        mid = (t_start + t_end) / 2.0
-        
-        # Find active events in this interval
-        active = [e for e in expanded_events if e["start"] <= mid and e["end"] > mid]
-        if not active:
-            continue
-            
-        # Group by alignment (must share same positioning)
-        by_align = {}
-        for e in active:
-            if e["alignment"] not in by_align:
-                by_align[e["alignment"]] = []
-            by_align[e["alignment"]].append(e)
-            
-        # Create Merged Events for each alignment group
-        for align, group in by_align.items():
-            primary = group[0]
-            
-            # Group events together for combined logic (alignment groups etc)
-            combined_lines_info = []
-            for e in group:
-                disp_text = f"{e['prefix']} {e['text']}" if e['prefix'] else e['text']
-                sub_lines = disp_text.split('\\N')
-                for sl in sub_lines:
-                    combined_lines_info.append({
-                        "text": sl,
-                        "style_name": e["style_name"],
-                        "has_outer": e["has_outer"],
-                        "font_size": e["font_size"]
-                    })
-            
-            line_height = primary['font_size'] * 1.1 
-            gap = 3 
-            base_v = primary['base_margin_v']
-            is_top = (primary['alignment'] in [7, 8, 9])
-            
-            for k, info in enumerate(combined_lines_info):
-                if is_top:
-                    offset_idx = k
-                else: 
-                    offset_idx = (len(combined_lines_info) - 1) - k
-                    
-                final_margin_v = int(base_v + (offset_idx * (line_height + gap)))
-                
-                merged_events.append({
-                    "start": t_start,
-                    "end": t_end,
-                    "style_name": info["style_name"],
-                    "has_outer": info["has_outer"],
-                    "alignment": primary['alignment'], 
-                    "line_text": info["text"],
-                    "margin_v": final_margin_v
-                })
-
-    # Generate ASS Content
-    ass_lines = []
+    # Per-event render plan; without a style_map every event uses the Default style
+    # Overrides come from one pass over style_map (keys are event indices as strings)
+    # instead of a str(i) lookup per event.
+    event_plans = [default_plan] * len(events)
+    for key, mapped_name in (style_map or {}).items():
+        # Only canonical index keys ("0", "1", ...) address an event
+        i = int(key) if isinstance(key, str) and key.isdecimal() else -1
+        if 0 <= i < len(events) and key == str(i):
+            event_plans[i] = style_plans.get(mapped_name, unknown_plan)
+    
+    # Struct-of-arrays view of the events, indexed by event id during the merge:
+    # times and alignments as plain lists, plus each event's shared plan fields
+    starts = [event["start_sec"] for event in events]
+    ends = [event["end_sec"] for event in events]
+    event_fields = [fields for _, fields in event_plans]
+    alignments = [fields["alignment"] for fields in event_fields]
+    
+    # Only cues lasting at least 10ms can be on screen: intervals shorter than that are
+    # skipped below. The rest stay in `events` so style_map indices are unaffected, and
+    # their boundaries still split intervals, but they never enter the sweep.
+    live = [i for i in range(len(events)) if ends[i] - starts[i] >= 0.01]
+    
+    # An event's display lines don't depend on the interval it is shown in: build its
+    # (line text, per-style Dialogue block template) pairs once, not per interval
+    event_lines = [None] * len(events)
+    for i in live:
+        style_name, fields = event_plans[i]
+        text = events[i]['text']
+        disp_text = f"{fields['prefix']} {text}" if fields['prefix'] else text
+        tmpl = _dialogue_block_template(style_name, fields["has_outer"])
+        event_lines[i] = [(sl, tmpl) for sl in disp_text.split('\\N')]
+
+    # Generate ASS Content: header and styles are assembled in one in-memory buffer
+    header = io.StringIO()
     
     # Header
-    ass_lines.append("[Script Info]")
-    ass_lines.append("ScriptType: v4.00+")
-    ass_lines.append("WrapStyle: 0")
-    ass_lines.append("PlayResX: 1920") 
-    ass_lines.append("PlayResY: 1080")
-    ass_lines.append("Collisions: Normal")
-    ass_lines.append("")
+    header.write("[Script Info]\n")
+    header.write("ScriptType: v4.00+\n")
+    header.write("WrapStyle: 0\n")
+    header.write("PlayResX: 1920\n")
+    header.write("PlayResY: 1080\n")
+    header.write("Collisions: Normal\n")
+    header.write("\n")
     
     # Styles
-    ass_lines.append("[V4+ Styles]")
-    ass_lines.append("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding")
+    header.write("[V4+ Styles]\n")
+    header.write(_STYLES_FORMAT_LINE + "\n")
     
     # Default Style
-    default_defs, default_has_outer = create_style_def("Default", styles)
-    ass_lines.extend(default_defs)
-    
-    # Saved Styles
-    if saved_styles:
-        for name, style_obj in saved_styles.items():
-            safe_name = name.replace(" ", "_").replace(",", "")
-            defs, h_out = create_style_def(safe_name, style_obj)
-            ass_lines.extend(defs)
+    default_defs, default_has_outer = create_style_def("Default", styles, h_multiplier)
+    for line in default_defs:
+        header.write(line + "\n")
+    
+    # Saved Styles (referenced by style_map)
+    for name, style_obj in used_saved_styles.items():
+        defs, h_out = create_style_def(safe_names[name], style_obj, h_multiplier)
+        for line in defs:
+            header.write(line + "\n")
             
-    ass_lines.append("")
+    header.write("\n")
     
-    # Events
-    ass_lines.append("[Events]")
-    ass_lines.append("Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text")
-    
-    PlayResX = 1920
-    PlayResY = 1080
-    
-    for event in merged_events:
-        s_start = seconds_to_ass_time(event["start"])
-        s_end = seconds_to_ass_time(event["end"])
-        sty = event["style_name"]
-        mv = event["margin_v"]
-        align = event["alignment"]
-        txt = event["line_text"]
-        
-        # Calculate X, Y
-        # Default margins from Style logic (simplified)
-        # Left(1,7): L=150
-        # Right(3,9): R=150
-        # Center(2,8): L=96, R=96 (screen center)
-        
-        # X Position
-        if align in [1, 7]: # Left
-            # X = MarginL. 
-            # Note: style defined MarginL is 150 (approx). 
-            # We should probably use the same value or calculated.
-            # But the MarginL in style is just default.
-            # Here we want to pin it.
-            pos_x = 150 # Standard left margin
-        elif align in [3, 9]: # Right
-            pos_x = PlayResX - 150 
-        else: # Center
-            pos_x = PlayResX // 2
+    # Events (each Dialogue line is written with a leading newline)
+    header.write("[Events]\n")
+    header.write(_EVENTS_FORMAT_LINE) # no trailing newline: Dialogue lines start with one
+    
+    # Header and styles are small and known before the sweep, so they are written
+    # first; Dialogue blocks are then streamed from the sweep to a buffered file in
+    # bounded chunks, so neither the script nor its list of blocks is ever held whole.
+    # Written in binary: each chunk is UTF-8 encoded in one call, bypassing TextIOWrapper
+    with open(output_path, 'wb', buffering=_IO_BUFFER_SIZE) as out:
+        out.write(header.getvalue().encode('utf-8'))
+        chunk = []
+        
+        # Merge Logic: Flatten overlaps into single events, each formatted straight into
+        # its block of layered Dialogue lines
+        PlayResX = 1920
+        PlayResY = 1080
+    
+        # 1. Collect all time points, plus event indices ordered by start and by end.
+        # Cue starts (and mostly ends) arrive in order, so sorting the concatenation is a
+        # C-level merge of two presorted runs; groupby then drops duplicates in one pass.
+        times = [t for t, _ in groupby(sorted(starts + ends))]
+        # Each boundary is formatted once; every line in an interval shares these strings
+        ass_times = [seconds_to_ass_time(t) for t in times]
+        by_start = sorted(live, key=starts.__getitem__)
+        by_end = sorted(live, key=ends.__getitem__)
+        next_start = next_end = 0
+        # Events on screen, grouped by alignment (must share same positioning)
+        active_by_align = defaultdict(set)
+    
+        # 2. Sweep the intervals, keeping the on-screen groups up to date
+        for j in range(len(times) - 1):
+            t_start = times[j]
+            t_end = times[j+1]
+        
+            # An event is active in (t_start, t_end) iff start <= t_start < end
+            while next_start < len(by_start) and starts[by_start[next_start]] <= t_start:
+                i = by_start[next_start]
+                active_by_align[alignments[i]].add(i)
+                next_start += 1
+            while next_end < len(by_end) and ends[by_end[next_end]] <= t_start:
+                # Ends at or before t_start imply a start before it, so the event is in its group
+                i = by_end[next_end]
+                align = alignments[i]
+                active_by_align[align].discard(i)
+                if not active_by_align[align]:
+                    del active_by_align[align]
+                next_end += 1
+        
+            if t_end - t_start < 0.01 or not active_by_align:
+                continue
             
-        # Y Position
-        if align in [1, 2, 3]: # Bottom
-            pos_y = PlayResY - mv
-        else: # Top
-            pos_y = mv
+            # Create Merged Events for each alignment group; groups are taken in order of
+            # their earliest cue and cue order decides stacking within a group
+            for ids in sorted(active_by_align.values(), key=min):
+                group = sorted(ids)
+                primary = event_fields[group[0]]
             
-        pos_tag = f"\\pos({pos_x},{pos_y})"
-        
-        # We use explicit \pos, so MarginL/R/V in event line can be 0
-        
-        # Layer 0: Box
-        ass_lines.append(f"Dialogue: 0,{s_start},{s_end},{sty}_Box,,0,0,0,,{{{pos_tag}}}{txt}")
-        
-        # Layer 1: Outer
-        if event["has_outer"]:
-            ass_lines.append(f"Dialogue: 1,{s_start},{s_end},{sty}_Outer,,0,0,0,,{{{pos_tag}}}{txt}")
+                # Group events together for combined logic (alignment groups etc)
+                combined_lines_info = [line for i in group for line in event_lines[i]]
             
-        # Layer 2: Inner
-        ass_lines.append(f"Dialogue: 2,{s_start},{s_end},{sty}_Inner,,0,0,0,,{{{pos_tag}}}{txt}")
-        
-        # Layer 3: Text
-        ass_lines.append(f"Dialogue: 3,{s_start},{s_end},{sty}_Text,,0,0,0,,{{{pos_tag}}}{txt}")
-        
-    # Write to file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("\n".join(ass_lines))
+                line_height = primary['font_size'] * 1.1 
+                gap = 3 
+                base_v = primary['base_margin_v']
+                align = primary['alignment']
+                is_top = (align in _TOP_ALIGNS)
+            
+                # Calculate X once per group: explicit \pos pinned at the style's side margin
+                # (Left(1,7): x=150, Right(3,9): x=PlayResX-150, Center(2,8): screen center)
+                pos_x = _POS_X.get(align, PlayResX // 2)
+            
+                for k, (line_text, tmpl) in enumerate(combined_lines_info):
+                    if is_top:
+                        offset_idx = k
+                    else: 
+                        offset_idx = (len(combined_lines_info) - 1) - k
+                    
+                    final_margin_v = int(base_v + (offset_idx * (line_height + gap)))
+                    pos_y = PlayResY - final_margin_v if align <= 3 else final_margin_v # Bottom rows measure from the bottom edge
+                
+                    # We use explicit \pos, so MarginL/R/V in event line can be 0
+                    # The layers only differ in layer number and style suffix; format the
+                    # positioned text body once per line and fill the per-style block template.
+                    chunk.append(tmpl % {
+                        "start": ass_times[j],
+                        "end": ass_times[j+1],
+                        "text": "{\\pos(%d,%d)}%s" % (pos_x, pos_y, line_text)
+                    })
+                    if len(chunk) >= _WRITE_CHUNK_ENTRIES:
+                        out.write("".join(chunk).encode('utf-8'))
+                        chunk.clear()
+
+        out.write("".join(chunk).encode('utf-8'))
         
     return output_path
-import random
 
 def generate_danmaku_ass(comments, output_path, resolution_x=1920, resolution_y=1080, font_size=48, speed_min=8, speed_max=12, emoji_map=None, emoji_dir=None):
     """
     Generate an ASS file for scrolling comments (Niconico style / Danmaku).
     Returns a list of emoji overlays: [{"path", "start", "end", "x_expr", "y_pos", "size"}]
     """
-    import re
-    
-    ass_lines = []
+    header = io.StringIO()
     emoji_overlays = []
     
     # Header
-    ass_lines.append("[Script Info]")
-    ass_lines.append("ScriptType: v4.00+")
-    ass_lines.append("WrapStyle: 2")
-    ass_lines.append(f"PlayResX: {resolution_x}")
-    ass_lines.append(f"PlayResY: {resolution_y}")
-    ass_lines.append("")
+    header.write("[Script Info]\n")
+    header.write("ScriptType: v4.00+\n")
+    header.write("WrapStyle: 2\n")
+    header.write(f"PlayResX: {resolution_x}\n")
+    header.write(f"PlayResY: {resolution_y}\n")
+    header.write("\n")
     
     # Styles
-    ass_lines.append("[V4+ Styles]")
-    ass_lines.append("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding")
+    header.write("[V4+ Styles]\n")
+    header.write(_STYLES_FORMAT_LINE + "\n")
     
     font_name = "Noto Sans CJK JP"
     # Calculate scaling factors (Reference: 1920x1080)
@@ -529,126 +621,157 @@ def generate_danmaku_ass(comments, output_path, resolution_x=1920, resolution_y=
 
     
     # Enhanced Style: Thicker outline (3) and added shadow (1) for better readability
-    ass_lines.append(f"Style: Danmaku,{font_name},{scaled_font_size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,3,1,4,0,0,0,1")
-    ass_lines.append("")
+    header.write(f"Style: Danmaku,{font_name},{scaled_font_size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,3,1,4,0,0,0,1\n")
+    header.write("\n")
     
     # Events
-    ass_lines.append("[Events]")
-    ass_lines.append("Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text")
+    header.write("[Events]\n")
+    header.write(_EVENTS_FORMAT_LINE) # no trailing newline: Dialogue lines start with one
     
     usable_height = resolution_y - margin_top - margin_bottom
     lane_height = int(scaled_font_size * 1.2)
     num_lanes = max(1, usable_height // lane_height)
     
-    lane_available_times = [0.0] * num_lanes
-    sorted_comments = sorted(comments, key=lambda x: x.get('timestamp', 0))
+    # Lanes known to be free are bits of free_lanes; the rest wait in a min-heap of
+    # (available_time, lane) and are moved into the mask once a comment starts after
+    # their available time.
+    free_lanes = (1 << num_lanes) - 1
+    busy_lanes = []
+    # Comments without a timestamp are treated as 0; normalize them (copies, the caller's
+    # dicts are untouched) so the sort key is a C-level itemgetter instead of a lambda
+    sorted_comments = sorted(
+        (c if 'timestamp' in c else {**c, 'timestamp': 0} for c in comments),
+        key=itemgetter('timestamp')
+    )
     
-    # Regex for emojis (same as frontend: anything between colons that isn't a colon or space)
-    emoji_pattern = re.compile(r'(:[^:\s]+:)')
+    # Per-comment geometry that does not depend on the comment itself
+    # Add generous buffer to ensure comment completely scrolls off
+    start_x = resolution_x + int(100 * scale_x)  # Start fully off right edge
+    end_x_buffer = int(300 * scale_x)  # Extra buffer past the left edge
+    # Japanese/Chinese characters are typically wider than font_size
+    # Use 2.0x multiplier for safe width estimation (accounts for bold fonts, spacing, etc.)
+    char_width = scaled_font_size * 2.0
+    lane_center = lane_height // 2
+    # Emoji shortcode -> image path (or None if missing), filled on first use so each
+    # distinct emoji costs one path join and one stat for the whole comment stream
+    emoji_paths = {}
     
-    for comment in sorted_comments:
-        original_text = comment.get('text', '')
-        if not original_text:
-            continue
+    # Stream Dialogue lines to the file in chunks rather than joining the whole script
+    # Written in binary: each chunk is UTF-8 encoded in one call, bypassing TextIOWrapper
+    with open(output_path, 'wb', buffering=_IO_BUFFER_SIZE) as f:
+        f.write(header.getvalue().encode('utf-8'))
+        chunk = []
+        
+        for comment in sorted_comments:
+            original_text = comment.get('text', '')
+            if not original_text:
+                continue
             
-        start_time = comment.get('timestamp', 0)
-        
-        # Estimated width for scrolling range (calculated first)
-        # Japanese/Chinese characters are typically wider than font_size
-        # Use 2.0x multiplier for safe width estimation (accounts for bold fonts, spacing, etc.)
-        # Use scaled_font_size for calculation
-        text_length = len(original_text)
-        estimated_width = text_length * scaled_font_size * 2.0
-        
-        # Add generous buffer to ensure comment completely scrolls off
-        start_x = resolution_x + int(100 * scale_x)  # Start fully off right edge
-        end_x = -(estimated_width + int(300 * scale_x))  # End fully off left edge with extra buffer
-        
-        # Calculate duration based on constant speed (pixels per second)
-        # This ensures comments completely scroll off before disappearing
-        total_distance = start_x - end_x  # Total pixels to travel
-        
-        # Slowed down for better readability: ~466 px/s (170% in 7 seconds at 1920px width)
-        # Scale speed based on resolution
-        base_speed_ref = random.uniform(430, 500)
-        base_speed = base_speed_ref * scale_x # pixels per second scaled
-        
-        # Duration = distance / speed
-        duration = total_distance / base_speed
-        
-        end_time = start_time + duration
-        
-        # Lane selection
-        chosen_lane = -1
-        lane_indices = list(range(num_lanes))
-        random.shuffle(lane_indices)
-        for lane_idx in lane_indices:
-            if start_time >= lane_available_times[lane_idx]:
-                chosen_lane = lane_idx
-                break
-        if chosen_lane == -1:
-             chosen_lane = min(range(num_lanes), key=lambda i: lane_available_times[i])
-        
-        lane_available_times[chosen_lane] = start_time + (duration * 0.3) 
-        y_pos = margin_top + (chosen_lane * lane_height) + (lane_height // 2)
-        
-        
-        # Process emojis in text
-        display_text = original_text
-        if emoji_map and emoji_dir:
-            parts = emoji_pattern.split(original_text)
-            new_parts = []
-            current_offset_chars = 0
+            start_time = comment['timestamp']
+        
+            # Estimated width for scrolling range (calculated first)
+            estimated_width = len(original_text) * char_width
+            end_x = -(estimated_width + end_x_buffer)  # End fully off left edge with extra buffer
+        
+            # Calculate duration based on constant speed (pixels per second)
+            # This ensures comments completely scroll off before disappearing
+            total_distance = start_x - end_x  # Total pixels to travel
+        
+            # Slowed down for better readability: ~466 px/s (170% in 7 seconds at 1920px width)
+            # Scale speed based on resolution
+            base_speed_ref = random.uniform(430, 500)
+            base_speed = base_speed_ref * scale_x # pixels per second scaled
+        
+            # Duration = distance / speed
+            duration = total_distance / base_speed
+        
+            end_time = start_time + duration
+        
+            # Lane selection: a random free lane spreads comments over the screen.
+            # If no lane is free, the one that frees up earliest is the best fallback.
+            while busy_lanes and busy_lanes[0][0] <= start_time:
+                free_lanes |= 1 << heapq.heappop(busy_lanes)[1]
+            if free_lanes:
+                # Walk to the k-th set bit, clearing lower bits with mask & (mask - 1)
+                mask = free_lanes
+                for _ in range(random.randrange(bin(mask).count('1'))):
+                    mask &= mask - 1
+                chosen_lane = (mask & -mask).bit_length() - 1
+                free_lanes &= ~(1 << chosen_lane)
+            else:
+                chosen_lane = heapq.heappop(busy_lanes)[1]
+            heapq.heappush(busy_lanes, (start_time + (duration * 0.3), chosen_lane))
+            y_pos = margin_top + (chosen_lane * lane_height) + lane_center
+        
+        
+            # Process emojis in text
+            display_text = original_text
+            if emoji_map and emoji_dir:
+                new_parts = []
+                current_offset_chars = 0
+                # One finditer pass: text between replaced emojis is copied over as literal spans
+                last = 0
             
-            for part in parts:
-                if emoji_pattern.match(part) and part in emoji_map:
+                for m in _EMOJI_RE.finditer(original_text):
+                    part = m.group()
+                    if part not in emoji_map:
+                        continue
                     # It's an emoji. Hide it in ASS text but add to overlays.
-                    img_name = emoji_map[part]
-                    img_path = os.path.join(emoji_dir, img_name)
-                    
-                    if os.path.exists(img_path):
-                        # Calculate emoji X expression: 
-                        # We guess the X position based on its character offset.
-                        # Niconico style: x(t) = start_x - ((t-start)/duration)*(start_x - end_x)
-                        # Offset factor: the emoji starts after 'current_offset_chars'
-                        # Roughly each char is `scaled_font_size` wide.
-                        char_offset_px = current_offset_chars * scaled_font_size
-                        
-                        # The emoji's x at time t is (text_x_at_t + char_offset_px)
-                        # expression = f"({start_x}-((t-{start_time:1f})/{duration:1f})*({start_x-end_x}))+{char_offset_px}"
-                        
-                        emoji_overlays.append({
-                            "path": img_path,
-                            "start": start_time,
-                            "end": end_time,
-                            "x_expr": f"({start_x}-((t-{start_time:.3f})/{duration:.3f})*({start_x - end_x}))+{char_offset_px}",
-                            "y_pos": y_pos - (scaled_font_size // 2), # Center it on the lane
-                            "size": int(scaled_font_size * 1.4)
-                        })
-                        
-                        # Replace with transparent placeholder to keep space? 
-                        # Actually ASS doesn't support easily "transparent but keep width" without complex tags.
-                        # Let's just use some spaces of similar width.
-                        # 1 emoji ~ 1.2 chars width?
-                        new_parts.append("  ") 
-                        current_offset_chars += 2
+                    # Resolved once per shortcode: None when the image file is missing
+                    if part in emoji_paths:
+                        img_path = emoji_paths[part]
                     else:
-                        # logger.warning(f"generate_danmaku_ass: Image file not found at {img_path}")
-                        new_parts.append(part)
-                        current_offset_chars += len(part)
-                else:
-                    new_parts.append(part)
-                    current_offset_chars += len(part)
-            display_text = "".join(new_parts)
-
-        # Convert to ASS time format
-        ass_start = seconds_to_ass_time(start_time)
-        ass_end = seconds_to_ass_time(end_time)
+                        img_path = os.path.join(emoji_dir, emoji_map[part])
+                        if not os.path.exists(img_path):
+                            # logger.warning(f"generate_danmaku_ass: Image file not found at {img_path}")
+                            img_path = None
+                        emoji_paths[part] = img_path
+                    if img_path is None:
+                        continue
+                    
+                    literal = original_text[last:m.start()]
+                    new_parts.append(literal)
+                    current_offset_chars += len(literal)
+                    last = m.end()
+                    
+                    # Calculate emoji X expression: 
+                    # We guess the X position based on its character offset.
+                    # Niconico style: x(t) = start_x - ((t-start)/duration)*(start_x - end_x)
+                    # Offset factor: the emoji starts after 'current_offset_chars'
+                    # Roughly each char is `scaled_font_size` wide.
+                    char_offset_px = current_offset_chars * scaled_font_size
+                    
+                    # The emoji's x at time t is (text_x_at_t + char_offset_px)
+                    # expression = f"({start_x}-((t-{start_time:1f})/{duration:1f})*({start_x-end_x}))+{char_offset_px}"
+                    
+                    emoji_overlays.append({
+                        "path": img_path,
+                        "start": start_time,
+                        "end": end_time,
+                        "x_expr": f"({start_x}-((t-{start_time:.3f})/{duration:.3f})*({start_x - end_x}))+{char_offset_px}",
+                        "y_pos": y_pos - (scaled_font_size // 2), # Center it on the lane
+                        "size": int(scaled_font_size * 1.4)
+                    })
+                    
+                    # Replace with transparent placeholder to keep space? 
+                    # Actually ASS doesn't support easily "transparent but keep width" without complex tags.
+                    # Let's just use some spaces of similar width.
+                    # 1 emoji ~ 1.2 chars width?
+                    new_parts.append("  ") 
+                    current_offset_chars += 2
+                    
+                new_parts.append(original_text[last:])
+                display_text = "".join(new_parts)
+
+            # Convert to ASS time format
+            ass_start = seconds_to_ass_time(start_time)
+            ass_end = seconds_to_ass_time(end_time)
         
-        move_tag = f"\\move({start_x},{y_pos},{end_x},{y_pos})"
-        ass_lines.append(f"Dialogue: 0,{ass_start},{ass_end},Danmaku,,0,0,0,,{{{move_tag}}}{display_text}")
+            chunk.append(_DANMAKU_TPL % (ass_start, ass_end, start_x, y_pos, end_x, y_pos, display_text))
+            if len(chunk) >= _WRITE_CHUNK_ENTRIES:
+                f.write("".join(chunk).encode('utf-8'))
+                chunk.clear()
         
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("\n".join(ass_lines))
+        f.write("".join(chunk).encode('utf-8'))
         
     return output_path, emoji_overlays
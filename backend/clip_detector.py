@@ -5,8 +5,70 @@ import re
 import math
 import os
 import subprocess
+import tempfile
+import heapq
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+try:
+    import orjson  # あれば無音キャッシュの読み書きに使う（C 実装で高速）
+except ImportError:
+    orjson = None
 from .config import OLLAMA_MODEL, OLLAMA_HOST, MIN_CLIP_DURATION, MAX_CLIP_DURATION
 
+# LLM 応答から JSON オブジェクト部分を取り出すためのパターン
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# 境界検出で JSON だけを返させるためのシステムメッセージ
+_JSON_BOUNDARIES_SYSTEM_MSG = {
+    'role': 'system',
+    'content': (
+        'You are a strict JSON generator. '
+        'Respond with a JSON object of the form {"boundaries": [...]} and nothing else.'
+    )
+}
+
+# ストリーム中の {"boundaries": [ の位置（ここから要素を1つずつ取り出す）
+_BOUNDARIES_ARRAY_START_RE = re.compile(r'"boundaries"\s*:\s*\[')
+_JSON_DECODER = json.JSONDecoder()
+
+@lru_cache(maxsize=16)
+def _boundaries_schema(target_boundaries: int) -> dict:
+    """
+    境界検出の出力を縛る JSON Schema（Ollama の format= に渡す）。
+    サーバー側でこの形にしかデコードされないため、応答の形の揺れを吸収する処理が要らない。
+    """
+    return {
+        'type': 'object',
+        'properties': {
+            'boundaries': {
+                'type': 'array',
+                'minItems': target_boundaries,
+                'maxItems': target_boundaries,
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'timestamp': {'type': 'number'},
+                        'description': {'type': 'string'},
+                    },
+                    'required': ['timestamp', 'description'],
+                },
+            },
+        },
+        'required': ['boundaries'],
+    }
+
+@lru_cache(maxsize=8)
+def _get_ollama_client(host: str, timeout: float):
+    """
+    ホスト・タイムアウトごとに ollama.Client を1つだけ作って再利用する
+    （呼び出しごとに HTTP 接続プールを作り直さないため）
+    """
+    return ollama.Client(host=host, timeout=timeout)
+
 def extend_short_clips(clips: list, video_duration: float, target_duration: float = None) -> list:
     """
     Extends clips that are shorter than MIN_CLIP_DURATION by adding time before and after.
@@ -23,6 +85,7 @@ def extend_short_clips(clips: list, video_duration: float, target_duration: floa
         target_duration = MIN_CLIP_DURATION
 
     extended_clips = []
+    extended_count = 0
 
     for clip in clips:
         original_start = clip['start']
@@ -32,7 +95,6 @@ def extend_short_clips(clips: list, video_duration: float, target_duration: floa
         if original_duration >= target_duration:
             # Clip is already long enough
             extended_clips.append(clip)
-            print(f"Clip '{clip.get('title', 'Unknown')}' is already {original_duration:.1f}s (>= {target_duration}s)")
         else:
             # Calculate how much time we need to add
             additional_time = target_duration - original_duration
@@ -53,22 +115,76 @@ def extend_short_clips(clips: list, video_duration: float, target_duration: floa
             if new_end == video_duration and (new_end - new_start) < target_duration:
                 new_start = max(0, video_duration - target_duration)
 
+            title = clip.get('title', 'タイトルなし')
+            reason = clip.get('reason', '興味深い瞬間')
             extended_clip = {
                 'start': new_start,
                 'end': new_end,
-                'title': clip.get('title', 'タイトルなし'),
-                'reason': clip.get('reason', '興味深い瞬間') + f" ({original_duration:.1f}秒から拡張)"
+                'title': title,
+                'reason': f"{reason} ({original_duration:.1f}秒から拡張)"
             }
 
             extended_clips.append(extended_clip)
-            print(f"Extended clip '{clip.get('title', 'Unknown')}' from {original_duration:.1f}s to {new_end - new_start:.1f}s (start: {original_start:.1f}→{new_start:.1f}, end: {original_end:.1f}→{new_end:.1f})")
+            extended_count += 1
+
+    # クリップごとではなく、まとめて1行だけ出力する
+    print(f"Extended {extended_count}/{len(clips)} clips to at least {target_duration}s")
 
     return extended_clips
 
+# プロセス内キャッシュ（dict）の読み書き用ロック
+# 解析はスレッドプールからも呼ばれるので、追加・追い出しは必ずこのロック内で行う
+_MEMO_LOCK = threading.Lock()
+
+def _memo_get(memo: dict, key):
+    """プロセス内キャッシュから key の値を取り出す（なければ None）"""
+    with _MEMO_LOCK:
+        return memo.get(key)
+
+def _memo_put(memo: dict, key, value, max_size: int) -> None:
+    """プロセス内キャッシュに登録する。上限を超える分は古いものから捨てる（dict は挿入順）"""
+    with _MEMO_LOCK:
+        if key not in memo:
+            while memo and len(memo) >= max_size:
+                memo.pop(next(iter(memo)), None)
+        memo[key] = value
+
+# プロセス内の無音検出結果キャッシュ
+# キー: (video_path, mtime_ns, size, min_silence_len, silence_thresh)
+# ファイルが更新されると mtime/size が変わるので自動的に無効になる
+_SILENCE_MEMO: dict = {}
+_SILENCE_MEMO_MAX = 8
+
+# silencedetect の出力行から無音区間の終了時刻を取り出す
+# 例: [silencedetect @ ...] silence_end: 125.789 | silence_duration: 2.333
+# ffmpeg は時刻を %g 形式で出すため、指数表記（5e-05 など）も受け付ける
+_SILENCE_END_RE = re.compile(rb'silence_end:\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)')
+
+def _json_loads(data: bytes):
+    """JSON バイト列を読み込む（orjson があればそれを使い、なければ標準の json）"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def _json_dumps(obj) -> bytes:
+    """JSON バイト列に書き出す（どちらで書いても同じ JSON 形式なので互換性は保たれる）"""
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode('utf-8')
+
+def _silence_cache_path(video_path: str, min_silence_len: int = 800, silence_thresh: int = -40) -> str:
+    """無音検出結果のキャッシュファイル（検出パラメータごとに1ファイル）"""
+    return f"{video_path}.silence.{min_silence_len}_{silence_thresh}.json"
+
+def _legacy_silence_cache_path(video_path: str) -> str:
+    """旧形式のキャッシュファイル（全パラメータの結果を1つの dict にまとめたもの）"""
+    return f"{video_path}.silence_cache.json"
+
+def _remember_silence(memo_key, boundaries: list) -> None:
+    if memo_key is None:
+        return
+    _memo_put(_SILENCE_MEMO, memo_key, tuple(boundaries), _SILENCE_MEMO_MAX)
+
 def detect_silence_boundaries(video_path: str, min_silence_len: int = 800, silence_thresh: int = -40) -> list:
     """
     音声ファイルから無音区間を検出して、話の区切り候補を返す
-    キャッシュ機能付き：一度検出した結果を保存して再利用
+    キャッシュ機能付き：一度検出した結果を保存して再利用（プロセス内メモリ + キャッシュファイル）
 
     Args:
         video_path: 動画ファイルのパス
@@ -79,23 +195,39 @@ def detect_silence_boundaries(video_path: str, min_silence_len: int = 800, silen
         無音区間の終了時刻のリスト（秒）
     """
     try:
+        # 同じプロセスで検出済みなら、キャッシュファイルの読み込みも ffmpeg も省略
+        try:
+            st = os.stat(video_path)
+            memo_key = (video_path, st.st_mtime_ns, st.st_size, min_silence_len, silence_thresh)
+        except OSError:
+            memo_key = None
+        memoized = _memo_get(_SILENCE_MEMO, memo_key)
+        if memoized is not None:
+            return list(memoized)
+
         # キャッシュファイルのパスを生成
-        cache_file = f"{video_path}.silence_cache.json"
+        # パラメータごとに別ファイルにして、読み書きは自分のリストだけで済むようにする
+        cache_file = _silence_cache_path(video_path, min_silence_len, silence_thresh)
+        legacy_cache_file = _legacy_silence_cache_path(video_path)
         cache_key = f"{min_silence_len}_{silence_thresh}"
 
-        # キャッシュが存在すればそれを使用
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                    if cache_key in cache_data:
-                        boundaries = cache_data[cache_key]
-                        sys.stderr.write(f"[SILENCE_DETECTOR] Using cached silence boundaries ({len(boundaries)} boundaries)\n")
-                        sys.stderr.flush()
-                        return boundaries
-            except Exception as e:
-                sys.stderr.write(f"[SILENCE_DETECTOR] Cache read error: {e}, proceeding with detection\n")
+        # キャッシュが存在すればそれを使用（なければ旧形式のキャッシュを参照）
+        try:
+            boundaries = None
+            if os.path.exists(cache_file):
+                with open(cache_file, 'rb') as f:
+                    boundaries = _json_loads(f.read())
+            elif os.path.exists(legacy_cache_file):
+                with open(legacy_cache_file, 'rb') as f:
+                    boundaries = _json_loads(f.read()).get(cache_key)
+            if boundaries is not None:
+                sys.stderr.write(f"[SILENCE_DETECTOR] Using cached silence boundaries ({len(boundaries)} boundaries)\n")
                 sys.stderr.flush()
+                _remember_silence(memo_key, boundaries)
+                return boundaries
+        except Exception as e:
+            sys.stderr.write(f"[SILENCE_DETECTOR] Cache read error: {e}, proceeding with detection\n")
+            sys.stderr.flush()
 
         sys.stderr.write(f"[SILENCE_DETECTOR] Detecting silence using ffmpeg (min_len={min_silence_len}ms, thresh={silence_thresh}dB)...\n")
         sys.stderr.flush()
@@ -104,62 +236,107 @@ def detect_silence_boundaries(video_path: str, min_silence_len: int = 800, silen
         duration_sec = min_silence_len / 1000.0
 
         # Construct ffmpeg command
-        # ffmpeg -i input.mp4 -af silencedetect=noise=-40dB:d=0.8 -f null -
+        # ffmpeg -i input.mp4 -map 0:a:0 -vn -sn -dn -af silencedetect=noise=-40dB:d=0.8 -f null -
+        # 映像・字幕・データストリームは無効化し、音声だけをデコードして一度で走査する
+        # （映像のデコードが処理時間の大半を占めるため）
+        # -map 0:a:0: 音声トラックが複数あっても最初の1本だけをデコードする
+        # -nostats / -hide_banner: 進捗行やバナーを出さず、stderr を silencedetect の出力だけにする
+        # -loglevel info: silencedetect の結果は info レベルで出るので、明示して取りこぼしを防ぐ
+        # -nostdin: 端末からのキー入力を待たない（バックグラウンド実行で止まらないように）
         cmd = [
             'ffmpeg',
+            '-nostdin', '-hide_banner', '-nostats', '-loglevel', 'info',
             '-i', video_path,
+            '-map', '0:a:0',
+            '-vn', '-sn', '-dn',
             '-af', f'silencedetect=noise={silence_thresh}dB:d={duration_sec}',
             '-f', 'null',
             '-'
         ]
 
         # Run ffmpeg
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        _, stderr = process.communicate()
-
-        # Parse output for silence_end
+        # stderr は溜め込まずに届いた行から順に解析する（長い動画でも出力全体をメモリに持たない）
+        # バイト列のまま扱うので、メタデータに UTF-8 以外の文字列が含まれていてもデコードで失敗しない
         boundaries = []
-        for line in stderr.split('\n'):
-            if 'silence_end' in line:
-                # Example: [silencedetect @ ...] silence_end: 125.789 | silence_duration: 2.333
-                try:
-                    parts = line.split('silence_end: ')
-                    if len(parts) > 1:
-                        end_time_str = parts[1].split('|')[0].strip()
-                        boundaries.append(float(end_time_str))
-                except Exception as e:
-                    print(f"Error parsing line: {line}, error: {e}")
+        with subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        ) as process:
+            search = _SILENCE_END_RE.search
+            for line in process.stderr:
+                m = search(line)
+                if m:
+                    boundaries.append(float(m.group(1)))
 
         sys.stderr.write(f"[SILENCE_DETECTOR] Found {len(boundaries)} silence boundaries\n")
         sys.stderr.flush()
 
         # キャッシュに保存
+        # 一時ファイルに書いてから置き換えるので、書き込み途中のファイルを読むことはない
         try:
-            cache_data = {}
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r') as f:
-                    cache_data = json.load(f)
-            cache_data[cache_key] = boundaries
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file) or '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(_json_dumps(boundaries))
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
             sys.stderr.write(f"[SILENCE_DETECTOR] Cached silence boundaries to {cache_file}\n")
             sys.stderr.flush()
         except Exception as e:
             sys.stderr.write(f"[SILENCE_DETECTOR] Cache write error: {e}\n")
             sys.stderr.flush()
 
+        _remember_silence(memo_key, boundaries)
         return boundaries
     except Exception as e:
         sys.stderr.write(f"[SILENCE_DETECTOR] Error: {e}\n")
         sys.stderr.flush()
         return []
 
+# プロセス内の動画情報（ffprobe 結果）キャッシュ
+# キー: (video_path, mtime_ns, size)。同じ動画を何度も解析しても ffprobe を起動し直さない
+_VIDEO_INFO_MEMO: dict = {}
+_VIDEO_INFO_MEMO_MAX = 64
+
+def _video_info_cached(video_path: str) -> dict:
+    """get_video_info の結果をファイルの更新時刻・サイズ単位で使い回す"""
+    from .video_processing import get_video_info
+    try:
+        st = os.stat(video_path)
+        memo_key = (video_path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return get_video_info(video_path)
+    info = _memo_get(_VIDEO_INFO_MEMO, memo_key)
+    if info is None:
+        info = get_video_info(video_path)
+        # 取得に失敗した場合（duration が 0）は次回また問い合わせる
+        if info.get('duration'):
+            _memo_put(_VIDEO_INFO_MEMO, memo_key, dict(info), _VIDEO_INFO_MEMO_MAX)
+    return dict(info)
+
+def _normalize_segments(segments: list) -> tuple:
+    """
+    文字起こしセグメント（Whisper のオブジェクト / dict）を
+    開始時刻・終了時刻・テキストの3つのリストに変換する。
+    形式の判定は先頭で一度だけ行い、以降はリストを直接参照する。
+    """
+    if not segments:
+        return [], [], []
+    if hasattr(segments[0], 'start'):
+        return ([seg.start for seg in segments],
+                [seg.end for seg in segments],
+                [seg.text for seg in segments])
+    return ([seg['start'] for seg in segments],
+            [seg['end'] for seg in segments],
+            [seg['text'] for seg in segments])
+
+# 句読点や改行で文章の区切りを判定（全角の文末記号・改行、または半角の文末記号 + 空白）
+_SENTENCE_END_RE = re.compile(r'[。！？\n]|[.!?]\s')
+
 def detect_sentence_boundaries(segments: list) -> list:
     """
     文字起こしセグメントから文章の区切りを検出
@@ -170,26 +347,30 @@ def detect_sentence_boundaries(segments: list) -> list:
     Returns:
         文章区切りの時刻リスト（秒）
     """
-    boundaries = []
-
-    # 句読点や改行で文章の区切りを判定
-    sentence_end_patterns = [r'[。！？\n]', r'[.!?]\s', r'\n']
+    _, ends, texts = _normalize_segments(segments)
+    return _sentence_boundaries(ends, texts)
 
-    for seg in segments:
-        text = seg.text if hasattr(seg, 'text') else seg['text']
-        end_time = seg.end if hasattr(seg, 'end') else seg['end']
-
-        # 文末記号があれば境界候補
-        for pattern in sentence_end_patterns:
-            if re.search(pattern, text):
-                boundaries.append(end_time)
-                break
+def _sentence_boundaries(ends: list, texts: list) -> list:
+    """正規化済みのセグメント列から文末記号で終わるセグメントの終了時刻を集める"""
+    search = _SENTENCE_END_RE.search
+    # 文末記号があれば境界候補
+    boundaries = [end_time for end_time, text in zip(ends, texts) if search(text)]
 
     sys.stderr.write(f"[SENTENCE_DETECTOR] Found {len(boundaries)} sentence boundaries\n")
     sys.stderr.flush()
 
     return boundaries
 
+def _has_neighbor(sorted_times: list, t: float, tol: float) -> bool:
+    """
+    ソート済みの sorted_times に t との距離が tol 未満の値があるか判定する
+    最も近い値は挿入位置の前後どちらかなので、二分探索で O(log N)
+    """
+    i = bisect_left(sorted_times, t)
+    if i < len(sorted_times) and abs(sorted_times[i] - t) < tol:
+        return True
+    return i > 0 and abs(t - sorted_times[i - 1]) < tol
+
 def detect_boundaries_hybrid(video_path: str, segments: list, max_clips: int = 5, start_time: float = 0) -> list:
     """
     ハイブリッド方式：無音区間 + 文章区切り + 時間制約を組み合わせて境界を検出
@@ -210,27 +391,27 @@ def detect_boundaries_hybrid(video_path: str, segments: list, max_clips: int = 5
     if not segments:
         return []
 
+    starts, ends, texts = _normalize_segments(segments)
+
     # start_time以降のセグメントのみをフィルタリング
     if start_time > 0:
-        filtered_segments = [
-            seg for seg in segments
-            if (seg.start if hasattr(seg, 'start') else seg['start']) >= start_time
-        ]
-        if not filtered_segments:
+        keep = [i for i, s in enumerate(starts) if s >= start_time]
+        if not keep:
             sys.stderr.write(f"[HYBRID_DETECTOR] No segments found after start_time={start_time}s\n")
             sys.stderr.flush()
             return []
-        segments = filtered_segments
-        sys.stderr.write(f"[HYBRID_DETECTOR] Filtered to {len(segments)} segments after start_time={start_time}s\n")
+        starts = [starts[i] for i in keep]
+        ends = [ends[i] for i in keep]
+        texts = [texts[i] for i in keep]
+        sys.stderr.write(f"[HYBRID_DETECTOR] Filtered to {len(starts)} segments after start_time={start_time}s\n")
         sys.stderr.flush()
 
-    first_time = segments[0].start if hasattr(segments[0], 'start') else segments[0]['start']
-    last_time = segments[-1].end if hasattr(segments[-1], 'end') else segments[-1]['end']
+    first_time = starts[0]
+    last_time = ends[-1]
 
     # Get actual video duration from file (not from segments)
-    from .video_processing import get_video_info
     try:
-        video_info = get_video_info(video_path)
+        video_info = _video_info_cached(video_path)
         actual_video_duration = video_info['duration']
     except Exception as e:
         sys.stderr.write(f"[HYBRID_DETECTOR] Warning: Could not get video duration from file: {e}, using segments\n")
@@ -239,25 +420,32 @@ def detect_boundaries_hybrid(video_path: str, segments: list, max_clips: int = 5
 
     # 1. 無音区間を検出
     # 動画が3時間以上の場合、初回実行ではsilence detectionをスキップ（キャッシュがある場合は使用）
-    silence_boundaries = []
-    cache_file = f"{video_path}.silence_cache.json"
+    run_silence = True
     if actual_video_duration > 10800:  # 3 hours
-        if os.path.exists(cache_file):
+        if os.path.exists(_silence_cache_path(video_path)) or os.path.exists(_legacy_silence_cache_path(video_path)):
             sys.stderr.write(f"[HYBRID_DETECTOR] Long video ({actual_video_duration/3600:.1f}h), checking for cached silence data...\n")
             sys.stderr.flush()
-            silence_boundaries = detect_silence_boundaries(video_path)
         else:
             sys.stderr.write(f"[HYBRID_DETECTOR] Skipping silence detection for long video ({actual_video_duration/3600:.1f}h, no cache found)\n")
             sys.stderr.flush()
-    else:
-        silence_boundaries = detect_silence_boundaries(video_path)
+            run_silence = False
+
+    # 無音検出（ffmpeg サブプロセス待ち）と文章区切り検出は互いに独立なので、
+    # 無音検出を別スレッドで走らせている間に文章区切りを検出する
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        silence_future = executor.submit(detect_silence_boundaries, video_path) if run_silence else None
+
+        # 2. 文章区切りを検出
+        sentence_boundaries = _sentence_boundaries(ends, texts)
 
-    # 2. 文章区切りを検出
-    sentence_boundaries = detect_sentence_boundaries(segments)
+        silence_boundaries = silence_future.result() if silence_future else []
 
     # 3. 両方の境界候補を統合
-    all_boundaries = set(silence_boundaries + sentence_boundaries)
-    all_boundaries = sorted(list(all_boundaries))
+    # どちらも通常は時刻順に並んでいる（sorted はほぼ線形で終わる）ので、
+    # set を作らずにマージしながら連続する重複を取り除く
+    sorted_silence = sorted(silence_boundaries)
+    sorted_sentence = sorted(sentence_boundaries)
+    all_boundaries = [t for t, _ in groupby(heapq.merge(sorted_silence, sorted_sentence))]
 
     sys.stderr.write(f"[HYBRID_DETECTOR] Total candidate boundaries: {len(all_boundaries)}\n")
     sys.stderr.flush()
@@ -272,14 +460,23 @@ def detect_boundaries_hybrid(video_path: str, segments: list, max_clips: int = 5
 
     filtered_boundaries = [first_time]
 
-    for boundary in all_boundaries:
+    # all_boundaries はソート済みなので、前の境界から MIN_CLIP_DURATION 以上離れた
+    # 次の候補へ二分探索で直接移動する（間の候補を1つずつ調べない）
+    n = len(all_boundaries)
+    i = bisect_left(all_boundaries, first_time)  # first_time 未満は範囲外
+    while i < n:
+        last = filtered_boundaries[-1]
+        j = bisect_left(all_boundaries, last + MIN_CLIP_DURATION, i)
+        # 浮動小数点の丸めで境目がずれた場合も「boundary - last >= MIN_CLIP_DURATION」で確定させる
+        while j > i and all_boundaries[j - 1] - last >= MIN_CLIP_DURATION:
+            j -= 1
+        while j < n and all_boundaries[j] - last < MIN_CLIP_DURATION:
+            j += 1
         # 範囲内かチェック
-        if boundary < first_time or boundary > last_time:
-            continue
-
-        # 前の境界と十分離れているかチェック
-        if boundary - filtered_boundaries[-1] >= MIN_CLIP_DURATION:
-            filtered_boundaries.append(boundary)
+        if j >= n or all_boundaries[j] > last_time:
+            break
+        filtered_boundaries.append(all_boundaries[j])
+        i = j + 1
 
     # 最後の境界を追加
     if filtered_boundaries[-1] < last_time - MIN_CLIP_DURATION:
@@ -289,19 +486,22 @@ def detect_boundaries_hybrid(video_path: str, segments: list, max_clips: int = 5
     target_boundaries = max_clips + 1  # クリップ数=境界数-1
     if len(filtered_boundaries) > target_boundaries:
         # 重要度でソート（無音と文章の両方で検出された境界を優先）
+        # 近傍判定はソート済みの候補に対する二分探索で行う
+        middle = filtered_boundaries[1:-1]  # 最初と最後は除外
         boundary_scores = []
-        for b in filtered_boundaries[1:-1]:  # 最初と最後は除外
+        for b in middle:
             score = 0
-            if any(abs(b - sb) < 0.5 for sb in silence_boundaries):
+            if _has_neighbor(sorted_silence, b, 0.5):
                 score += 2  # 無音境界は重要度高
-            if any(abs(b - sb) < 0.5 for sb in sentence_boundaries):
+            if _has_neighbor(sorted_sentence, b, 0.5):
                 score += 1  # 文章境界
-            boundary_scores.append((b, score))
+            boundary_scores.append(score)
 
         # スコアでソートして上位を選択
-        boundary_scores.sort(key=lambda x: x[1], reverse=True)
-        selected = [first_time] + [b for b, s in boundary_scores[:target_boundaries-2]] + [last_time]
-        filtered_boundaries = sorted(selected)
+        # middle は時刻順なので、選んだ位置を元の順に並べれば時刻でソートし直す必要はない
+        ranked = sorted(range(len(middle)), key=boundary_scores.__getitem__, reverse=True)
+        keep = set(ranked[:target_boundaries-2])
+        filtered_boundaries = [first_time] + [b for k, b in enumerate(middle) if k in keep] + [last_time]
 
     sys.stderr.write(f"[HYBRID_DETECTOR] Final boundaries: {len(filtered_boundaries)}\n")
     sys.stderr.flush()
@@ -374,7 +574,86 @@ def _build_comment_summary(comments: list, window_start: float, window_end: floa
     return '\n'.join(lines)
 
 
-def _analyze_chunk_with_ai(segments: list, comments: list,
+# AI に渡す字幕の圧縮設定
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_TAIL_RE = re.compile(r'[。！？.!?]$')
+_MERGE_MAX_GAP = 0.3    # これより短い間隔で続くセグメントは1行にまとめる（秒）
+_MERGE_MAX_SPAN = 10.0  # まとめた1行が覆う最大の長さ（秒）
+
+def _compact_segments(starts: list, ends: list, texts: list) -> tuple:
+    """
+    AI に渡す字幕を短くする。空白を詰め、間を置かずに続く文の途中のセグメントを
+    1つにまとめる（プロンプトのトークン数を減らし、サンプリングで落ちる情報を減らす）。
+    """
+    out_starts: list = []
+    out_ends: list = []
+    out_texts: list = []
+    for start, end, text in zip(starts, ends, texts):
+        text = _WHITESPACE_RE.sub(' ', str(text)).strip()
+        if not text:
+            continue
+        if (out_texts
+                and start - out_ends[-1] < _MERGE_MAX_GAP
+                and end - out_starts[-1] <= _MERGE_MAX_SPAN
+                and not _SENTENCE_TAIL_RE.search(out_texts[-1])):
+            out_ends[-1] = end
+            # 英数字同士の間だけ空白を挟む（日本語はそのまま連結）
+            prev = out_texts[-1]
+            out_texts[-1] = f"{prev} {text}" if prev[-1].isascii() and text[0].isascii() else prev + text
+            continue
+        out_starts.append(start)
+        out_ends.append(end)
+        out_texts.append(text)
+    return out_starts, out_ends, out_texts
+
+def _collect_streamed_boundaries(stream, target_boundaries: int) -> list:
+    """
+    Ollama のストリーム応答から "boundaries" 配列の要素を届いた順に取り出す。
+    目標数に達した時点でストリームを閉じ、残りの生成を待たずに打ち切る。
+    """
+    buf = ''
+    pos = -1
+    boundaries = []
+    try:
+        for chunk in stream:
+            buf += chunk['message']['content']
+            if pos < 0:
+                m = _BOUNDARIES_ARRAY_START_RE.search(buf)
+                if not m:
+                    continue
+                pos = m.end()
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos >= len(buf):
+                    break
+                if buf[pos] == ']':
+                    return boundaries
+                try:
+                    item, pos = _JSON_DECODER.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 要素がまだ途中までしか届いていない
+                    break
+                boundaries.append(item)
+                if len(boundaries) >= target_boundaries:
+                    return boundaries
+        if pos < 0:
+            sys.stderr.write(f"[CLIP_DETECTOR] Could not parse boundaries JSON: {buf[:200]}\n")
+            sys.stderr.flush()
+        return boundaries
+    finally:
+        # ジェネレータを閉じると接続が切れ、サーバー側の生成も止まる
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+
+# プロセス内の境界検出結果キャッシュ
+# キー: (host, model, プロンプトの sha256)。同じ字幕を再解析するときは LLM を呼ばない
+_CHUNK_BOUNDARY_MEMO: dict = {}
+_CHUNK_BOUNDARY_MEMO_MAX = 32
+
+def _analyze_chunk_with_ai(starts: list, ends: list, texts: list, comments: list,
                             first_ts: float, last_ts: float,
                             target_boundaries: int,
                             context: str = '',
@@ -384,12 +663,8 @@ def _analyze_chunk_with_ai(segments: list, comments: list,
     1つの時間チャンクを Ollama で解析して境界リストを返す内部関数。
     """
     # ── 字幕テキスト組み立て ────────────────────────────────────────────────
-    transcript_text = ""
-    for seg in segments:
-        start = seg.get('start') if isinstance(seg, dict) else seg.start
-        end   = seg.get('end')   if isinstance(seg, dict) else seg.end
-        text  = seg.get('text')  if isinstance(seg, dict) else seg.text
-        transcript_text += f"[{start:.1f}-{end:.1f}] {text}\n"
+    # 終了時刻は次の行の開始時刻で分かるので、開始時刻だけを付ける
+    transcript_text = "".join(f"[{start:.1f}]{text}\n" for start, text in zip(starts, texts))
 
     # ── コメントサマリー組み立て ─────────────────────────────────────────────
     comment_section = ""
@@ -408,15 +683,15 @@ Video range: {first_ts:.1f}s - {last_ts:.1f}s
 Find EXACTLY {target_boundaries} timestamps where exciting/interesting moments occur.
 {"Use BOTH the transcript AND the live chat comments to identify high-energy moments (many comments, laughter 'w'/'草', excitement, reactions)." if has_comments else "Use the transcript to identify topic shifts and interesting moments."}
 
-REQUIRED OUTPUT format (JSON array only, start with [):
-[
+REQUIRED OUTPUT format (JSON object only):
+{{"boundaries": [
   {{"timestamp": 50, "description": "moment description"}},
   {{"timestamp": 150, "description": "moment description"}}
-]
+]}}
 
 RULES:
-1. Return ONLY a JSON array starting with [ and ending with ]
-2. Include EXACTLY {target_boundaries} objects
+1. Return ONLY the JSON object
+2. Include EXACTLY {target_boundaries} objects in "boundaries"
 3. Timestamps MUST be between {first_ts:.1f} and {last_ts:.1f}
 4. Spread timestamps across the full range
 5. Prefer timestamps where comments are densest / transcript shows excitement{comment_section}
@@ -424,87 +699,58 @@ RULES:
 Transcript:
 {transcript_text}
 
-JSON array (start with [):"""
+JSON:"""
 
     try:
         actual_host = ollama_host if ollama_host else OLLAMA_HOST
         actual_model = ollama_model if ollama_model else OLLAMA_MODEL
-        client = ollama.Client(host=actual_host, timeout=90.0)
-
-        best_boundaries: list = []
-        best_count = 0
-
-        for attempt in range(3):
-            temp = 0.1 if attempt == 0 else (0.3 if attempt == 1 else 0.5)
-            try:
-                sys.stderr.write(
-                    f"[CLIP_DETECTOR] Chunk {first_ts:.0f}-{last_ts:.0f}s, "
-                    f"attempt {attempt+1}/3, temp={temp}, "
-                    f"comments={'yes' if has_comments else 'no'}\n"
-                )
-                sys.stderr.flush()
+        client = _get_ollama_client(actual_host, 90.0)
+
+        # プロンプトには字幕・コメント・目標数がすべて含まれるので、これをキーにする
+        memo_key = (actual_host, actual_model,
+                    hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        cached = _memo_get(_CHUNK_BOUNDARY_MEMO, memo_key)
+        if cached is not None:
+            sys.stderr.write(
+                f"[CLIP_DETECTOR] Chunk {first_ts:.0f}-{last_ts:.0f}s, "
+                f"using cached boundaries ({len(cached)})\n"
+            )
+            sys.stderr.flush()
+            return [dict(b) if isinstance(b, dict) else b for b in cached]
 
-                response = client.chat(
-                    model=actual_model,
-                    messages=[
-                        {
-                            'role': 'system',
-                            'content': (
-                                'You are a strict JSON array generator. '
-                                'Your response MUST start with [ and end with ]. '
-                                'NEVER return anything except a JSON array.'
-                            )
-                        },
-                        {'role': 'user', 'content': prompt},
-                    ],
-                    format='json',
-                    options={'temperature': temp, 'num_predict': 1500, 'num_ctx': 32768},
-                )
-
-                content = response['message']['content']
-                parsed = json.loads(content.strip())
-
-                boundaries: list = []
-                if isinstance(parsed, list):
-                    boundaries = parsed
-                elif isinstance(parsed, dict):
-                    for key in ('boundaries', 'clips', 'segments', 'data',
-                                'results', 'topics', 'moments'):
-                        if key in parsed and isinstance(parsed[key], list):
-                            boundaries = parsed[key]
-                            break
-                    else:
-                        if 'timestamp' in parsed:
-                            boundaries = [parsed]
-
-                if len(boundaries) > best_count:
-                    best_count = len(boundaries)
-                    best_boundaries = boundaries
-                    if best_count >= target_boundaries:
-                        break
-
-            except json.JSONDecodeError:
-                import re as _re
-                m = _re.search(r'\[.*\]', content, _re.DOTALL)
-                if m:
-                    try:
-                        boundaries = json.loads(m.group(0))
-                        if len(boundaries) > best_count:
-                            best_count = len(boundaries)
-                            best_boundaries = boundaries
-                    except Exception:
-                        pass
-            except Exception as e:
-                sys.stderr.write(f"[CLIP_DETECTOR] Attempt {attempt+1} error: {e}\n")
-                sys.stderr.flush()
+        sys.stderr.write(
+            f"[CLIP_DETECTOR] Chunk {first_ts:.0f}-{last_ts:.0f}s, "
+            f"comments={'yes' if has_comments else 'no'}\n"
+        )
+        sys.stderr.flush()
 
-        return best_boundaries
+        # スキーマで出力形式を縛るので、1回の問い合わせで解析可能な応答が返る。
+        # ストリームで受け取り、目標数の境界が揃った時点で生成を打ち切る
+        stream = client.chat(
+            model=actual_model,
+            messages=[
+                _JSON_BOUNDARIES_SYSTEM_MSG,
+                {'role': 'user', 'content': prompt},
+            ],
+            format=_boundaries_schema(target_boundaries),
+            options={'temperature': 0.1, 'num_predict': 1500, 'num_ctx': 32768},
+            stream=True,
+        )
+        boundaries = _collect_streamed_boundaries(stream, target_boundaries)
 
     except Exception as e:
         sys.stderr.write(f"[CLIP_DETECTOR] _analyze_chunk_with_ai error: {e}\n")
         sys.stderr.flush()
         return []
 
+    # 何も取れなかった応答は覚えず、次回は問い合わせ直す
+    # （キャッシュへの登録は解析の成否判定とは切り離し、取れた結果は必ず返す）
+    if boundaries:
+        _memo_put(_CHUNK_BOUNDARY_MEMO, memo_key,
+                  tuple(dict(b) if isinstance(b, dict) else b for b in boundaries),
+                  _CHUNK_BOUNDARY_MEMO_MAX)
+    return boundaries
+
 def analyze_transcript_with_ai(segments: list, max_clips: int = 5,
                                 start_time: float = 0,
                                 comments: list = None,
@@ -523,35 +769,34 @@ def analyze_transcript_with_ai(segments: list, max_clips: int = 5,
     """
 
     CHUNK_MINUTES = 60          # 1チャンクあたりの時間（分）※スペックアップにより拡大
-    MAX_SEGS_PER_CHUNK = 500    # 1チャンクに含める最大セグメント数（スペックアップにより拡大）
+    MAX_SEGS_PER_CHUNK = 600    # 1チャンクに含める最大セグメント数（行を圧縮した分だけ拡大）
     comments = comments or []
 
+    starts, ends, texts = _normalize_segments(segments)
+
     # start_time以降のセグメントのみをフィルタリング
     if start_time > 0:
-        segments = [
-            seg for seg in segments
-            if (seg.get('start') if isinstance(seg, dict) else seg.start) >= start_time
-        ]
-        if not segments:
+        keep = [i for i, s in enumerate(starts) if s >= start_time]
+        if not keep:
             print(f"Warning: No segments found after start_time={start_time}s")
             return []
-        print(f"Filtered to {len(segments)} segments after start_time={start_time}s")
+        starts = [starts[i] for i in keep]
+        ends = [ends[i] for i in keep]
+        texts = [texts[i] for i in keep]
+        print(f"Filtered to {len(starts)} segments after start_time={start_time}s")
 
-    if not segments:
+    if not starts:
         return []
 
-    def _get(seg, key):
-        return seg.get(key) if isinstance(seg, dict) else getattr(seg, key)
-
-    first_time_all = _get(segments[0], 'start')
-    last_time_all  = _get(segments[-1], 'end')
+    first_time_all = starts[0]
+    last_time_all  = ends[-1]
     total_duration = last_time_all - first_time_all
 
     # ── チャンク分割 ────────────────────────────────────────────────────────
     chunk_sec = CHUNK_MINUTES * 60
     if total_duration <= chunk_sec:
         # 短い場合は分割なし
-        chunks = [(segments, first_time_all, last_time_all)]
+        chunks = [(list(range(len(starts))), first_time_all, last_time_all)]
         print(f"[AI_ANALYZE] Single chunk: {first_time_all:.0f}s-{last_time_all:.0f}s "
               f"({total_duration/60:.1f}min, comments={len(comments)})")
     else:
@@ -559,10 +804,10 @@ def analyze_transcript_with_ai(segments: list, max_clips: int = 5,
         chunk_start = first_time_all
         while chunk_start < last_time_all:
             chunk_end = min(chunk_start + chunk_sec, last_time_all)
-            chunk_segs = [s for s in segments
-                          if _get(s, 'start') >= chunk_start and _get(s, 'end') <= chunk_end + 10]
-            if chunk_segs:
-                chunks.append((chunk_segs, chunk_start, chunk_end))
+            seg_idx = [i for i, (s, e) in enumerate(zip(starts, ends))
+                       if s >= chunk_start and e <= chunk_end + 10]
+            if seg_idx:
+                chunks.append((seg_idx, chunk_start, chunk_end))
             chunk_start = chunk_end
         print(f"[AI_ANALYZE] Split into {len(chunks)} chunks "
               f"({CHUNK_MINUTES}min each, total {total_duration/60:.1f}min, comments={len(comments)})")
@@ -573,36 +818,61 @@ def analyze_transcript_with_ai(segments: list, max_clips: int = 5,
     boundaries_per_chunk = max(4, target_total_boundaries // len(chunks))
 
     # ── チャンクごとにAI解析 ─────────────────────────────────────────────────
+    # チャンク同士は独立しているので、Ollama への問い合わせは並列に投げる
+    # （結果はチャンク順に集める）
     all_raw_boundaries: list = []
 
-    for chunk_idx, (chunk_segs, c_start, c_end) in enumerate(chunks):
-        print(f"[AI_ANALYZE] Chunk {chunk_idx+1}/{len(chunks)}: "
-              f"{c_start:.0f}s-{c_end:.0f}s ({len(chunk_segs)} segs)")
-
-        # セグメント数が多すぎる場合は時間ベースでサンプリング
-        if len(chunk_segs) > MAX_SEGS_PER_CHUNK:
-            time_range = c_end - c_start
-            sampled: list = []
-            for i in range(MAX_SEGS_PER_CHUNK):
-                target_t = c_start + (time_range * i / MAX_SEGS_PER_CHUNK)
-                closest = min(chunk_segs, key=lambda s: abs(_get(s, 'start') - target_t))
-                if not sampled or closest is not sampled[-1]:
-                    sampled.append(closest)
-            chunk_segs = sampled
-            print(f"[AI_ANALYZE]   Sampled to {len(chunk_segs)} segments")
-
-        raw = _analyze_chunk_with_ai(
-            segments=chunk_segs,
-            comments=comments,
-            first_ts=c_start,
-            last_ts=c_end,
-            target_boundaries=boundaries_per_chunk,
-            context=context,
-            ollama_host=ollama_host,
-            ollama_model=ollama_model
-        )
-        print(f"[AI_ANALYZE]   Got {len(raw)} raw boundaries from chunk {chunk_idx+1}")
-        all_raw_boundaries.extend(raw)
+    with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as executor:
+        futures = []
+        for chunk_idx, (seg_idx, c_start, c_end) in enumerate(chunks):
+            print(f"[AI_ANALYZE] Chunk {chunk_idx+1}/{len(chunks)}: "
+                  f"{c_start:.0f}s-{c_end:.0f}s ({len(seg_idx)} segs)")
+
+            # 間を置かずに続くセグメントをまとめてから、必要ならサンプリングする
+            chunk_starts, chunk_ends, chunk_texts = _compact_segments(
+                [starts[k] for k in seg_idx],
+                [ends[k] for k in seg_idx],
+                [texts[k] for k in seg_idx],
+            )
+            if len(chunk_starts) < len(seg_idx):
+                print(f"[AI_ANALYZE]   Compacted to {len(chunk_starts)} segments")
+
+            # セグメント数が多すぎる場合は時間ベースでサンプリング
+            if len(chunk_starts) > MAX_SEGS_PER_CHUNK:
+                time_range = c_end - c_start
+                # セグメントは開始時刻順なので、最も近いセグメントは二分探索で求める
+                sampled_idx: list = []
+                for i in range(MAX_SEGS_PER_CHUNK):
+                    target_t = c_start + (time_range * i / MAX_SEGS_PER_CHUNK)
+                    j = bisect_left(chunk_starts, target_t)
+                    if j == len(chunk_starts) or (j > 0 and target_t - chunk_starts[j - 1] <= chunk_starts[j] - target_t):
+                        # 直前側が同じかより近い（同じ開始時刻が並ぶ場合は先頭を採用）
+                        j = bisect_left(chunk_starts, chunk_starts[j - 1])
+                    if not sampled_idx or j != sampled_idx[-1]:
+                        sampled_idx.append(j)
+                chunk_starts = [chunk_starts[j] for j in sampled_idx]
+                chunk_ends = [chunk_ends[j] for j in sampled_idx]
+                chunk_texts = [chunk_texts[j] for j in sampled_idx]
+                print(f"[AI_ANALYZE]   Sampled to {len(chunk_starts)} segments")
+
+            futures.append(executor.submit(
+                _analyze_chunk_with_ai,
+                starts=chunk_starts,
+                ends=chunk_ends,
+                texts=chunk_texts,
+                comments=comments,
+                first_ts=c_start,
+                last_ts=c_end,
+                target_boundaries=boundaries_per_chunk,
+                context=context,
+                ollama_host=ollama_host,
+                ollama_model=ollama_model
+            ))
+
+        for chunk_idx, future in enumerate(futures):
+            raw = future.result()
+            print(f"[AI_ANALYZE]   Got {len(raw)} raw boundaries from chunk {chunk_idx+1}")
+            all_raw_boundaries.extend(raw)
 
     # ── 全チャンクの境界を正規化 ─────────────────────────────────────────────
     def _normalize_boundary(b) -> dict | None:
@@ -652,32 +922,91 @@ def analyze_transcript_with_ai(segments: list, max_clips: int = 5,
         })
 
     # ── MIN_CLIP_DURATION 未満は隣と結合 ─────────────────────────────────
+    # 1回の走査で、短いクリップを後続と結合していく（タイトルは最後にまとめて連結）
     merged_clips = []
+    n = len(raw_clips)
     i = 0
-    while i < len(raw_clips):
-        cur = raw_clips[i].copy()
-        while cur['duration'] < MIN_CLIP_DURATION and i + 1 < len(raw_clips):
+    while i < n:
+        start = raw_clips[i]['start']
+        end = raw_clips[i]['end']
+        duration = raw_clips[i]['duration']
+        titles = [raw_clips[i]['title']]
+        while duration < MIN_CLIP_DURATION and i + 1 < n:
             nxt = raw_clips[i + 1]
-            cur['end'] = nxt['end']
-            cur['duration'] = cur['end'] - cur['start']
-            if cur['title'] != nxt['title']:
-                cur['title'] = f"{cur['title']} → {nxt['title']}"
+            end = nxt['end']
+            duration = end - start
+            # 単独のタイトルと同じなら重複させない
+            if len(titles) > 1 or titles[0] != nxt['title']:
+                titles.append(nxt['title'])
             i += 1
-        if cur['duration'] > MAX_CLIP_DURATION:
-            cur['end'] = cur['start'] + MAX_CLIP_DURATION
-            cur['duration'] = MAX_CLIP_DURATION
-        if cur['duration'] >= MIN_CLIP_DURATION:
+        if duration > MAX_CLIP_DURATION:
+            end = start + MAX_CLIP_DURATION
+            duration = MAX_CLIP_DURATION
+        if duration >= MIN_CLIP_DURATION:
             merged_clips.append({
-                'start': cur['start'],
-                'end': cur['end'],
-                'title': cur['title'],
-                'reason': f"{cur['duration']:.1f}秒のクリップ",
+                'start': start,
+                'end': end,
+                'title': ' → '.join(titles),
+                'reason': f"{duration:.1f}秒のクリップ",
             })
         i += 1
 
     print(f"[AI_ANALYZE] Generated {len(merged_clips)} clips from {len(boundaries)} boundaries")
     return merged_clips
 
+# VTT のタイミング行（時は省略可、行末のキュー設定は無視）と直後のテキスト行
+_VTT_CUE_RE = re.compile(
+    r'^[ \t]*(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)[ \t]*-->[ \t]*(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)[^\n]*\n([^\n]*)',
+    re.MULTILINE
+)
+
+def _vtt_seconds(h: str, m: str, sec: str) -> float:
+    """_VTT_CUE_RE が取り出した時・分・秒（時は空文字のことがある）を秒に変換"""
+    seconds = float(sec) + int(m) * 60
+    if h:
+        seconds += int(h) * 3600
+    return seconds
+
+@lru_cache(maxsize=4)
+def _load_vtt_cues(vtt_path: str, mtime_ns: int, size: int) -> tuple:
+    """
+    VTT を一度だけ解析し、(開始秒, 終了秒, テキスト行) のタプルと
+    開始時刻順に並んでいるかどうかを返す
+    mtime/size はキャッシュキー（ファイルが更新されたら読み直す）
+    """
+    with open(vtt_path, "r", encoding="utf-8") as f:
+        data = f.read()
+
+    # タイミング行とその次の行（テキスト行）を1回の正規表現走査でまとめて取り出す
+    cues = []
+    for h1, m1, s1, h2, m2, s2, text_line in _VTT_CUE_RE.findall(data):
+        text_line = text_line.strip()
+        if text_line and not text_line.isdigit() and "WEBVTT" not in text_line:
+            cues.append((_vtt_seconds(h1, m1, s1), _vtt_seconds(h2, m2, s2), text_line))
+
+    is_sorted = all(a[0] <= b[0] for a, b in zip(cues, cues[1:]))
+    return tuple(cues), is_sorted
+
+def _clip_text_from_vtt(vtt_path: str, start_time: float, end_time: float) -> str:
+    """クリップ範囲 [start_time, end_time] に収まる字幕のテキストを連結して返す"""
+    st = os.stat(vtt_path)
+    cues, is_sorted = _load_vtt_cues(vtt_path, st.st_mtime_ns, st.st_size)
+
+    # 通常の VTT は開始時刻順なので、範囲内の最初の字幕を二分探索で求め、
+    # 開始時刻が範囲を超えたら打ち切る（順序が乱れている場合は全件を走査）
+    i = bisect_left(cues, start_time, key=lambda c: c[0]) if is_sorted else 0
+    texts = []
+    for cue_start, cue_end, text_line in cues[i:]:
+        if is_sorted and cue_start > end_time:
+            break
+        if cue_start < start_time:
+            continue
+        # Check if this segment is within the clip range
+        if cue_end <= end_time:
+            texts.append(text_line)
+
+    return "".join(f"{t} " for t in texts)
+
 def evaluate_clip_quality(vtt_path: str, start_time: float, end_time: float, ollama_host: str = None, ollama_model: str = None) -> dict:
     """
     Evaluates the quality/interestingness of a clip using AI.
@@ -692,37 +1021,8 @@ def evaluate_clip_quality(vtt_path: str, start_time: float, end_time: float, oll
         dict with 'score' (int 1-5) and 'reason' (str)
     """
     try:
-        # Parse VTT to extract text for this time range
-        with open(vtt_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        clip_text = ""
-        current_start = 0
-        current_end = 0
-
-        for i, line in enumerate(lines):
-            if "-->" in line:
-                times = line.strip().split(" --> ")
-
-                def parse_time(t):
-                    parts = t.split(":")
-                    seconds = float(parts[-1])
-                    if len(parts) > 1:
-                        seconds += int(parts[-2]) * 60
-                    if len(parts) > 2:
-                        seconds += int(parts[-3]) * 3600
-                    return seconds
-
-                current_start = parse_time(times[0])
-                current_end = parse_time(times[1])
-
-                # Check if this segment is within the clip range
-                if current_start >= start_time and current_end <= end_time:
-                    # Get the text line (next non-empty line)
-                    if i + 1 < len(lines):
-                        text_line = lines[i + 1].strip()
-                        if text_line and not text_line.isdigit() and "WEBVTT" not in text_line:
-                            clip_text += text_line + " "
+        # Extract subtitle text for this time range
+        clip_text = _clip_text_from_vtt(vtt_path, start_time, end_time)
 
         if not clip_text.strip():
             return {"score": 3, "reason": "字幕テキストが見つかりませんでした"}
@@ -756,7 +1056,7 @@ def evaluate_clip_quality(vtt_path: str, start_time: float, end_time: float, oll
 
         actual_host = ollama_host if ollama_host else OLLAMA_HOST
         actual_model = ollama_model if ollama_model else OLLAMA_MODEL
-        client = ollama.Client(host=actual_host, timeout=60.0)
+        client = _get_ollama_client(actual_host, 60.0)
         response = client.chat(model=actual_model, messages=[
             {
                 'role': 'user',
@@ -770,8 +1070,7 @@ def evaluate_clip_quality(vtt_path: str, start_time: float, end_time: float, oll
         sys.stderr.flush()
 
         # Extract JSON from response
-        import re
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        json_match = _JSON_OBJECT_RE.search(content)
         if json_match:
             content = json_match.group(0)
 
@@ -796,9 +1095,27 @@ def evaluate_clip_quality(vtt_path: str, start_time: float, end_time: float, oll
         sys.stderr.flush()
         return {"score": 3, "reason": f"評価エラー: {str(e)}"}
 
-    # TODO: Implement VTT parsing if needed.
-    # For now, we will rely on the main flow passing segments or re-reading them.
-    pass
+def evaluate_clips_quality(vtt_path: str, clips: list, ollama_host: str = None, ollama_model: str = None) -> list:
+    """
+    複数クリップを並列に評価する（Ollama への問い合わせを同時に投げる）
+    VTT の解析結果はキャッシュされるため、ファイルの読み込みは1回で済む
+
+    Args:
+        vtt_path: Path to the VTT subtitle file
+        clips: List of clip dictionaries with 'start' and 'end'
+
+    Returns:
+        evaluate_clip_quality の結果（dict）のリスト（clips と同じ順序）
+    """
+    if not clips:
+        return []
+    with ThreadPoolExecutor(max_workers=min(8, len(clips))) as executor:
+        futures = [
+            executor.submit(evaluate_clip_quality, vtt_path, clip['start'], clip['end'],
+                            ollama_host=ollama_host, ollama_model=ollama_model)
+            for clip in clips
+        ]
+        return [future.result() for future in futures]
 
 def count_comments_in_clips(clips: list, comments_path: str) -> list:
     """
@@ -886,11 +1203,13 @@ def count_comments_in_clips(clips: list, comments_path: str) -> list:
         print(f"Extracted {len(comment_times)} time-synced comments/timestamps")
         
         # Count for each clip
+        # 時刻をソートしておけば、[start, end] 内の件数は二分探索2回で求まる
+        comment_times.sort()
         for clip in clips:
             start = clip['start']
             end = clip['end']
             duration = end - start
-            count = sum(1 for t in comment_times if start <= t <= end)
+            count = max(0, bisect_right(comment_times, end) - bisect_left(comment_times, start))
             clip['comment_count'] = count
             
             # Calculate comments per minute
@@ -910,6 +1229,9 @@ def count_comments_in_clips(clips: list, comments_path: str) -> list:
         traceback.print_exc()
         return clips
 
+# 「www」のような笑いの連続（コメント1件ごとに数えるので事前にコンパイルしておく）
+_LAUGH_RE = re.compile(r'[wWｗＷ]{3,}')
+
 def detect_emoji_density_clips(comments_path: str, video_duration: float, category: str = "kusa", custom_patterns: list = None, clip_duration: int = 60, start_time: float = 0) -> list:
     """
     Detects clips based on specific emoji/pattern density in comments.
@@ -934,7 +1256,7 @@ def detect_emoji_density_clips(comments_path: str, video_duration: float, catego
         
         if category == "kusa":
             patterns = [':*kusa*:', ':kusa:', '草', '草生える', '草生えた', '大草原', '草不可避', 'くさ', 'クサ', 'ｸｻ']
-            regex_patterns = [r'[wWｗＷ]{3,}']
+            regex_patterns = [_LAUGH_RE]
         elif category == "kawaii":
             patterns = ['かわいい', 'カワイイ', '可愛い', 'kawaii', 'Kawaii', 'てぇてぇ', '助かる', 'たすかる', '天使']
         
@@ -971,8 +1293,7 @@ def detect_emoji_density_clips(comments_path: str, video_duration: float, catego
                                             for p in patterns:
                                                 count += text.count(p)
                                             for rp in regex_patterns:
-                                                import re
-                                                count += len(re.findall(rp, text))
+                                                count += len(rp.findall(text))
                                         if 'emoji' in run:
                                             emoji = run['emoji']
                                             shortcuts = emoji.get('shortcuts', [])
@@ -1008,8 +1329,7 @@ def detect_emoji_density_clips(comments_path: str, video_duration: float, catego
                 for p in patterns:
                     count += text.count(p)
                 for rp in regex_patterns:
-                    import re
-                    count += len(re.findall(rp, text))
+                    count += len(rp.findall(text))
                 if count > 0:
                     if timestamp >= start_time:
                         events.append((float(timestamp), count))